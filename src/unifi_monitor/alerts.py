@@ -4,7 +4,9 @@
 from __future__ import annotations
 
 import logging
+import operator
 import time
+from collections.abc import Callable, Sequence
 from dataclasses import dataclass, field
 
 import httpx
@@ -12,102 +14,158 @@ import httpx
 log = logging.getLogger(__name__)
 
 OPERATORS = {
-    "gt": lambda v, t: v > t,
-    "lt": lambda v, t: v < t,
-    "eq": lambda v, t: v == t,
-    "ne": lambda v, t: v != t,
+    "gt": operator.gt,
+    "lt": operator.lt,
+    "eq": operator.eq,
+    "ne": operator.ne,
 }
 
 
-@dataclass
+# Webhook circuit breaker: consecutive failures before pausing, and pause length
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN_S = 60
+
+# Expected value type per metric; rule thresholds are coerced to it for comparison
+_METRIC_TYPES: dict[str, type] = {
+    "wan_status": str,
+    "wan_latency": float,
+    "health_score": float,
+    "device_offline": int,
+    "client_signal": float,
+}
+
+
+@dataclass(frozen=True, slots=True)
 class AlertRule:
     metric: str
     operator: str
     threshold: float | str
     message: str
     cooldown_s: int = 300
-
-    @property
-    def key(self) -> str:
-        return f"{self.metric}_{self.operator}_{self.threshold}"
+    # Derived once at construction; used for cooldown tracking and alert payloads
+    key: str = field(init=False, repr=False, compare=False)
+    label: str = field(init=False, repr=False, compare=False)
+    # Threshold coerced to the metric's value type; only used for the comparison
+    typed_threshold: float | str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Frozen: derived fields are set once via object.__setattr__.
+        # Key/label keep the threshold as written so cooldown keys and webhook
+        # payloads don't change with the coercion.
+        key = f"{self.metric}_{self.operator}_{self.threshold}"
+        metric_type = _METRIC_TYPES.get(self.metric)
+        if metric_type is None:
+            raise ValueError(f"Unknown alert metric {self.metric!r}")
+        if (
+            metric_type is int
+            and isinstance(self.threshold, float)
+            and not self.threshold.is_integer()
+        ):
+            raise ValueError(f"Invalid threshold for alert rule {key}: must be an integer")
+        try:
+            typed = metric_type(self.threshold)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid threshold for alert rule {key}: {e}") from e
+        object.__setattr__(self, "typed_threshold", typed)
+        object.__setattr__(self, "key", key)
+        object.__setattr__(self, "label", f"{self.metric} {self.operator} {self.threshold}")
 
 
-DEFAULT_RULES = [
+DEFAULT_RULES: tuple[AlertRule, ...] = (
     AlertRule("wan_status", "ne", "ok", "WAN is {value}", 300),
     AlertRule("health_score", "lt", 50, "Health score dropped to {value}", 300),
     AlertRule("device_offline", "gt", 0, "{value} device(s) offline", 300),
     AlertRule("wan_latency", "gt", 100, "WAN latency {value}ms", 600),
-]
+)
+
+
+def _wan(snapshot: dict) -> dict:
+    return snapshot.get("overview", {}).get("wan", {})
+
+
+def _extract_device_offline(snapshot: dict) -> object | None:
+    devices = snapshot.get("overview", {}).get("devices", {})
+    return devices.get("total", 0) - devices.get("online", 0)
+
+
+def _extract_client_signal(snapshot: dict) -> object | None:
+    # Min signal across all wireless clients
+    clients = snapshot.get("clients", [])
+    signals = (c.get("signal_dbm") for c in clients)
+    return min((s for s in signals if s is not None), default=None)
+
+
+_METRIC_EXTRACTORS: dict[str, Callable[[dict], object | None]] = {
+    "wan_status": lambda s: _wan(s).get("status"),
+    "wan_latency": lambda s: _wan(s).get("latency_ms"),
+    "health_score": lambda s: s.get("overview", {}).get("health_score"),
+    "device_offline": _extract_device_offline,
+    "client_signal": _extract_client_signal,
+}
 
 
 def _extract_metric(snapshot: dict, metric: str) -> object | None:
     """Extract a metric value from the WS snapshot structure."""
-    overview = snapshot.get("overview", {})
-    wan = overview.get("wan", {})
-
-    if metric == "wan_status":
-        return wan.get("status")
-    if metric == "wan_latency":
-        return wan.get("latency_ms")
-    if metric == "health_score":
-        return overview.get("health_score")
-    if metric == "device_offline":
-        devices = overview.get("devices", {})
-        total = devices.get("total", 0)
-        online = devices.get("online", 0)
-        return total - online
-    if metric == "client_signal":
-        # Min signal across all wireless clients
-        clients = snapshot.get("clients", [])
-        signals = [c.get("signal_dbm") for c in clients if c.get("signal_dbm") is not None]
-        return min(signals) if signals else None
-    return None
+    fn = _METRIC_EXTRACTORS.get(metric)
+    return fn(snapshot) if fn else None
+
+
+# (extractor, operator fn, threshold, source rule)
+_CompiledRule = tuple[Callable[[dict], object], Callable[[object, object], bool], object, AlertRule]
 
 
 @dataclass
 class AlertEngine:
-    rules: list[AlertRule] = field(default_factory=lambda: list(DEFAULT_RULES))
+    rules: Sequence[AlertRule] = DEFAULT_RULES
     webhook_url: str | None = None
-    _cooldowns: dict[str, float] = field(default_factory=dict)
+    # Last fire time per compiled rule, indexed by position in `_compiled`
+    _last_fired: list[float] = field(default_factory=list, init=False, repr=False)
+    _compiled: list[_CompiledRule] = field(default_factory=list, init=False, repr=False)
+    _client: httpx.AsyncClient | None = field(default=None, init=False, repr=False)
+    _breaker_failures: int = field(default=0, init=False, repr=False)
+    _breaker_until: float = field(default=0.0, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._compile_rules()
+
+    def _compile_rules(self) -> None:
+        """Resolve extractor and operator once per rule (thresholds are typed by AlertRule).
+
+        Unknown operators raise ValueError. Call again after replacing `rules`.
+        """
+        compiled: list[_CompiledRule] = []
+        for rule in self.rules:
+            op_fn = OPERATORS.get(rule.operator)
+            if op_fn is None:
+                raise ValueError(f"Unknown alert operator {rule.operator!r} in rule {rule.key}")
+            compiled.append((_METRIC_EXTRACTORS[rule.metric], op_fn, rule.typed_threshold, rule))
+        # Carry cooldown state across recompiles by rule key
+        previous = {c[3].key: ts for c, ts in zip(self._compiled, self._last_fired, strict=True)}
+        self._compiled = compiled
+        self._last_fired = [previous.get(c[3].key, 0.0) for c in compiled]
 
     def evaluate(self, snapshot: dict) -> list[dict]:
         """Evaluate all rules against a snapshot. Returns list of fired alerts."""
         fired: list[dict] = []
         now = time.time()
 
-        for rule in self.rules:
-            value = _extract_metric(snapshot, rule.metric)
-            if value is None:
-                continue
-
-            op_fn = OPERATORS.get(rule.operator)
-            if op_fn is None:
-                continue
-
-            try:
-                if isinstance(rule.threshold, type(value)):
-                    threshold = rule.threshold
-                else:
-                    threshold = type(value)(rule.threshold)
-                if not op_fn(value, threshold):
-                    continue
-            except (ValueError, TypeError):
+        last_fired = self._last_fired
+        for i, (extractor, op_fn, threshold, rule) in enumerate(self._compiled):
+            value = extractor(snapshot)
+            if value is None or not op_fn(value, threshold):
                 continue
 
             # Check cooldown
-            last_fired = self._cooldowns.get(rule.key, 0)
-            if now - last_fired < rule.cooldown_s:
+            if now - last_fired[i] < rule.cooldown_s:
                 continue
 
-            self._cooldowns[rule.key] = now
+            last_fired[i] = now
             fired.append(
                 {
-                    "rule": f"{rule.metric} {rule.operator} {rule.threshold}",
+                    "rule": rule.label,
                     "value": value,
-                    "message": rule.message.format(
-                        value=value,
-                        metric=rule.metric,
-                        threshold=rule.threshold,
+                    "message": rule.message.format_map(
+                        {"value": value, "metric": rule.metric, "threshold": rule.threshold}
                     ),
                     "ts": now,
                 }
@@ -116,9 +174,17 @@ class AlertEngine:
         return fired
 
     async def notify(self, alerts: list[dict]) -> None:
-        """POST fired alerts to webhook URL."""
+        """POST fired alerts to webhook URL.
+
+        After BREAKER_THRESHOLD consecutive transport failures the webhook is skipped
+        for BREAKER_COOLDOWN_S seconds, so a dead endpoint doesn't cost a 10s timeout
+        on every poll cycle.
+        """
         if not self.webhook_url or not alerts:
             return
+        if time.time() < self._breaker_until:
+            log.debug("Alert webhook circuit open, dropping %d alert(s)", len(alerts))
+            return
 
         payload = {
             "alerts": alerts,
@@ -126,12 +192,37 @@ class AlertEngine:
             "timestamp": time.time(),
         }
 
+        # Reuse one pooled client so repeat alerts skip DNS/TCP/TLS setup
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(max_keepalive_connections=4, max_connections=8),
+            )
+
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                resp = await client.post(self.webhook_url, json=payload)
-                if resp.status_code >= 400:
-                    log.warning("Alert webhook returned %d: %s", resp.status_code, resp.text[:200])
-                else:
-                    log.info("Alert webhook sent (%d alerts)", len(alerts))
+            resp = await self._client.post(self.webhook_url, json=payload)
         except httpx.HTTPError as e:
-            log.warning("Alert webhook failed: %s", e)
+            self._breaker_failures += 1
+            if self._breaker_failures >= BREAKER_THRESHOLD:
+                self._breaker_until = time.time() + BREAKER_COOLDOWN_S
+                log.warning(
+                    "Alert webhook failed %d times, pausing for %ds: %s",
+                    self._breaker_failures,
+                    BREAKER_COOLDOWN_S,
+                    e,
+                )
+            else:
+                log.warning("Alert webhook failed: %s", e)
+            return
+
+        self._breaker_failures = 0
+        if resp.status_code >= 400:
+            log.warning("Alert webhook returned %d: %s", resp.status_code, resp.text[:200])
+        else:
+            log.info("Alert webhook sent (%d alerts)", len(alerts))
+
+    async def aclose(self) -> None:
+        """Close the pooled webhook client. Called on app shutdown."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -3,30 +3,72 @@
 
 from __future__ import annotations
 
+import asyncio
 import csv
-import hashlib
-import io
+import hmac
 import secrets
 import sqlite3
 import time
-from typing import Any
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, Literal
 
+import orjson
 from fastapi import APIRouter, Depends, Query, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from ..config import config
 from ..db import Database
 
-router = APIRouter(prefix="/api")
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson (C encoder) -- several times faster on row lists."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+router = APIRouter(prefix="/api", default_response_class=ORJSONResponse)
+
+
+# (hour, username, password) -> (current token, previous-hour token). Refreshed
+# lazily on hour rollover or credential change, so the hot path is a tuple compare.
+_token_cache: tuple[tuple[int, str, str], tuple[str, str]] | None = None
+
+
+def _hash_token(username: str, password: str, hour: int) -> str:
+    key = f"{username}:{password}".encode()
+    return hmac.digest(key, str(hour).encode(), "sha256")[:16].hex()
+
+
+def _valid_ws_tokens() -> tuple[str, str]:
+    """Return the (current hour, previous hour) WS tokens."""
+    global _token_cache
+    hour = int(time.time() // 3600)
+    username, password = config.auth_username, config.auth_password
+    key = (hour, username, password)
+    if _token_cache is None or _token_cache[0] != key:
+        _token_cache = (
+            key,
+            (_hash_token(username, password, hour), _hash_token(username, password, hour - 1)),
+        )
+    return _token_cache[1]
 
 
 def _ws_token(hour_offset: int = 0) -> str:
     """Generate an hour-based WS auth token. Accepts current and previous hour."""
-    hour = int(time.time() // 3600) + hour_offset
-    raw = f"{config.auth_username}:{config.auth_password}:{hour}"
-    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+    if hour_offset in (0, -1):
+        return _valid_ws_tokens()[-hour_offset]
+    hour = int(time.time() // 3600)
+    return _hash_token(config.auth_username, config.auth_password, hour + hour_offset)
 
 
+# Query enums validated as Literals (set membership) rather than regex patterns
+CompareMetric = Literal["latency", "bandwidth", "client_count"]
+ExportFormat = Literal["json", "csv"]
+
+# Max age of a cached /api/overview payload (poll data changes every ~30s)
+OVERVIEW_CACHE_TTL = 2.0
+
 PROTO_MAP = {1: "ICMP", 6: "TCP", 17: "UDP", 47: "GRE", 50: "ESP", 58: "ICMPv6"}
 
 
@@ -46,41 +88,29 @@ def get_site(request: Request, site: str = Query(None)) -> str:
     return site
 
 
-def _fmt_bytes(b: int | float | None) -> str:
-    if not b:
-        return "0 B"
-    b = float(b)
-    if b >= 1_073_741_824:
-        return f"{b / 1_073_741_824:.1f} GB"
-    if b >= 1_048_576:
-        return f"{b / 1_048_576:.1f} MB"
-    if b >= 1024:
-        return f"{b / 1024:.1f} KB"
-    return f"{b:.0f} B"
-
-
-def _compute_health(wan: dict | None, devices: list[dict], alarms: list[dict]) -> dict[str, Any]:
+def _compute_health(wan: dict | None, offline_count: int, alarms: list[dict]) -> dict[str, Any]:
     """Weighted health score with documented factors."""
     score = 100
     factors: list[str] = []
 
     # WAN status (40% weight)
-    if not wan or wan.get("status") != "ok":
+    status = wan.get("status") if wan else None
+    latency = wan.get("latency_ms") if wan else None
+    if status != "ok":
         score -= 40
         factors.append("WAN down")
-    elif wan.get("latency_ms") and wan["latency_ms"] > 100:
+    elif latency and latency > 100:
         score -= 15
-        factors.append(f"High latency ({wan['latency_ms']:.0f}ms)")
-    elif wan.get("latency_ms") and wan["latency_ms"] > 50:
+        factors.append(f"High latency ({latency:.0f}ms)")
+    elif latency and latency > 50:
         score -= 5
-        factors.append(f"Elevated latency ({wan['latency_ms']:.0f}ms)")
+        factors.append(f"Elevated latency ({latency:.0f}ms)")
 
     # Device health (30% weight)
-    offline = [d for d in devices if d.get("state") != 1]
-    if offline:
-        penalty = min(30, 15 * len(offline))
+    if offline_count:
+        penalty = min(30, 15 * offline_count)
         score -= penalty
-        factors.append(f"{len(offline)} device(s) offline")
+        factors.append(f"{offline_count} device(s) offline")
 
     # Alarms (30% weight)
     alarm_penalty = min(30, 5 * len(alarms))
@@ -102,7 +132,7 @@ def health_check(request: Request) -> dict:
     }
     if db is not None:
         try:
-            stats = db.get_db_stats()
+            stats = db.get_db_stats(counts=False)
             result["last_write_ts"] = stats.get("last_write_ts", 0)
             result["db_size_bytes"] = stats.get("db_size_bytes", 0)
         except sqlite3.OperationalError:
@@ -128,22 +158,70 @@ def list_sites(request: Request) -> dict:
 
 
 @router.get("/overview")
-def overview(db: Database = Depends(get_db), site: str = Depends(get_site)) -> dict:
+async def overview(
+    request: Request, db: Database = Depends(get_db), site: str = Depends(get_site)
+) -> dict:
     """Dashboard overview: WAN status, device/client counts, health score."""
+    # Per-site cache: (built_at, db, last_write_ts, payload). Reused while younger
+    # than the TTL and no new poll data has been written since it was built.
+    state = request.app.state
+    cache: dict[str, tuple[float, Database, float, dict]] | None = getattr(
+        state, "overview_cache", None
+    )
+    if cache is None:
+        cache = state.overview_cache = {}
+        state.overview_locks = {}
+    hit = _overview_hit(cache, site, db)
+    if hit is not None:
+        return hit
+
+    # Single-flight: concurrent tabs missing the cache wait on one rebuild
+    # instead of each fanning out four queries.
+    lock = state.overview_locks.setdefault(site, asyncio.Lock())
+    async with lock:
+        hit = _overview_hit(cache, site, db)
+        if hit is not None:
+            return hit
+        return await _build_overview(cache, site, db)
+
+
+def _overview_hit(
+    cache: dict[str, tuple[float, Database, float, dict]], site: str, db: Database
+) -> dict | None:
+    """Return the cached overview payload for site if still fresh."""
+    hit = cache.get(site)
+    if (
+        hit is not None
+        and time.time() - hit[0] < OVERVIEW_CACHE_TTL
+        and hit[1] is db
+        and hit[2] == db.last_write_ts
+    ):
+        return hit[3]
+    return None
+
+
+async def _build_overview(
+    cache: dict[str, tuple[float, Database, float, dict]], site: str, db: Database
+) -> Any:
+    """Query and assemble the overview payload, storing it in the cache."""
+    now = time.time()
+    last_write_ts = db.last_write_ts
+    # Independent reads: run them in parallel on worker threads (each thread has
+    # its own WAL connection), so latency is the slowest query, not the sum.
+    # Devices and clients are only counted, so SQLite aggregates them.
     try:
-        wan = db.get_latest_wan(site=site)
-        devices = db.get_latest_devices(site=site)
-        clients = db.get_latest_clients(site=site)
-        alarms = db.get_active_alarms(site=site)
+        wan, devices, clients, alarms = await asyncio.gather(
+            asyncio.to_thread(db.get_latest_wan, site=site),
+            asyncio.to_thread(db.get_latest_device_counts, site=site),
+            asyncio.to_thread(db.get_latest_client_counts, site=site),
+            asyncio.to_thread(db.get_active_alarms, site=site),
+        )
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
-    wireless_clients = [c for c in clients if not c.get("is_wired")]
-    wired_clients = [c for c in clients if c.get("is_wired")]
+    health = _compute_health(wan, devices["total"] - devices["online"], alarms)
 
-    health = _compute_health(wan, devices, alarms)
-
-    return {
+    payload = {
         "health_score": health["score"],
         "health_factors": health["factors"],
         "wan": {
@@ -154,17 +232,19 @@ def overview(db: Database = Depends(get_db), site: str = Depends(get_site)) -> d
             "mem_pct": round(wan["mem_pct"], 1) if wan and wan.get("mem_pct") else None,
         },
         "devices": {
-            "total": len(devices),
-            "online": sum(1 for d in devices if d.get("state") == 1),
+            "total": devices["total"],
+            "online": devices["online"],
         },
         "clients": {
-            "total": len(clients),
-            "wireless": len(wireless_clients),
-            "wired": len(wired_clients),
+            "total": clients["total"],
+            "wireless": clients["total"] - clients["wired"],
+            "wired": clients["wired"],
         },
         "alarms": len(alarms),
-        "timestamp": time.time(),
+        "timestamp": now,
     }
+    cache[site] = (now, db, last_write_ts, payload)
+    return payload
 
 
 @router.get("/clients")
@@ -176,15 +256,17 @@ def get_clients(
 ) -> dict:
     """All connected clients with stats, paginated."""
     try:
-        clients = db.get_latest_clients(site=site)
+        # One snapshot: a poll committing between the two reads can't skew total
+        with db.read_snapshot():
+            total = db.count_latest_clients(site=site)
+            page = db.get_latest_clients_page(offset, limit, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
-    clients.sort(key=lambda c: c.get("rx_bytes") or 0, reverse=True)
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
     return {
-        "total": len(clients),
+        "total": total,
         "offset": offset,
         "limit": limit,
-        "data": clients[offset : offset + limit],
+        "data": page,
     }
 
 
@@ -199,7 +281,7 @@ def client_history(
     try:
         return db.get_client_history(mac, hours, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/devices")
@@ -208,7 +290,7 @@ def get_devices(db: Database = Depends(get_db), site: str = Depends(get_site)) -
     try:
         return db.get_latest_devices(site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/wan/history")
@@ -221,7 +303,7 @@ def wan_history(
     try:
         return db.get_wan_history(hours, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/traffic/top-talkers")
@@ -233,12 +315,9 @@ def top_talkers(
 ) -> list[dict]:
     """Top source IPs by bytes (NetFlow data)."""
     try:
-        rows = db.get_top_talkers(hours, limit, site=site)
+        return db.get_top_talkers(hours, limit, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
-    for r in rows:
-        r["total_bytes_fmt"] = _fmt_bytes(r.get("total_bytes"))
-    return rows
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/traffic/top-destinations")
@@ -250,12 +329,9 @@ def top_destinations(
 ) -> list[dict]:
     """Top destination IPs by bytes (NetFlow data)."""
     try:
-        rows = db.get_top_destinations(hours, limit, site=site)
+        return db.get_top_destinations(hours, limit, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
-    for r in rows:
-        r["total_bytes_fmt"] = _fmt_bytes(r.get("total_bytes"))
-    return rows
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/traffic/top-ports")
@@ -269,10 +345,10 @@ def top_ports(
     try:
         rows = db.get_top_ports(hours, limit, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
     for r in rows:
-        r["total_bytes_fmt"] = _fmt_bytes(r.get("total_bytes"))
-        r["protocol_name"] = PROTO_MAP.get(r.get("protocol"), str(r.get("protocol", "")))
+        proto = r.get("protocol")
+        r["protocol_name"] = PROTO_MAP.get(proto) or ("" if proto is None else str(proto))
     return rows
 
 
@@ -285,12 +361,9 @@ def dns_queries(
 ) -> list[dict]:
     """DNS query aggregates: per-client-per-server."""
     try:
-        rows = db.get_dns_queries(hours, limit, site=site)
+        return db.get_dns_queries(hours, limit, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
-    for r in rows:
-        r["total_bytes_fmt"] = _fmt_bytes(r.get("total_bytes"))
-    return rows
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/traffic/dns-top-clients")
@@ -302,12 +375,9 @@ def dns_top_clients(
 ) -> list[dict]:
     """Top DNS-querying clients by flow count."""
     try:
-        rows = db.get_dns_top_clients(hours, limit, site=site)
+        return db.get_dns_top_clients(hours, limit, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
-    for r in rows:
-        r["total_bytes_fmt"] = _fmt_bytes(r.get("total_bytes"))
-    return rows
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/traffic/dns-top-servers")
@@ -319,12 +389,9 @@ def dns_top_servers(
 ) -> list[dict]:
     """Top DNS servers by flow count."""
     try:
-        rows = db.get_dns_top_servers(hours, limit, site=site)
+        return db.get_dns_top_servers(hours, limit, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
-    for r in rows:
-        r["total_bytes_fmt"] = _fmt_bytes(r.get("total_bytes"))
-    return rows
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/traffic/bandwidth")
@@ -336,19 +403,16 @@ def bandwidth_timeseries(
 ) -> list[dict]:
     """Bandwidth over time in configurable buckets."""
     try:
-        rows = db.get_bandwidth_timeseries(hours, bucket_minutes, site=site)
+        return db.get_bandwidth_timeseries(hours, bucket_minutes, site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
-    for r in rows:
-        r["mbps"] = round((r.get("total_bytes", 0) * 8) / (bucket_minutes * 60 * 1_000_000), 2)
-    return rows
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/compare")
 def compare(
     db: Database = Depends(get_db),
     site: str = Depends(get_site),
-    metric: str = Query(..., pattern=r"^(latency|bandwidth|client_count)$"),
+    metric: CompareMetric = Query(...),
     hours: float = Query(24, ge=1, le=8760),
     offset_hours: float = Query(168, ge=1, le=8760),
 ) -> dict:
@@ -362,21 +426,34 @@ def get_alarms(db: Database = Depends(get_db), site: str = Depends(get_site)) ->
     try:
         return db.get_active_alarms(site=site)
     except sqlite3.OperationalError as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 
-def _csv_response(rows: list[dict], name: str) -> StreamingResponse:
-    """Build a CSV streaming response from a list of dicts."""
-    buf = io.StringIO()
-    if not rows:
-        buf.write("no data\n")
-    else:
-        writer = csv.DictWriter(buf, fieldnames=rows[0].keys())
-        writer.writeheader()
-        writer.writerows(rows)
-    buf.seek(0)
+class _Echo:
+    """File-like whose write() hands the formatted line straight back (no buffering)."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _iter_csv(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[str]:
+    """Yield CSV text one row at a time without accumulating the file."""
+    it = iter(rows)
+    first = next(it, None)
+    if first is None:
+        yield "no data\n"
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    yield writer.writerow(first)
+    for row in it:
+        yield writer.writerow(row)
+
+
+def _csv_response(header: Sequence[str], rows: Iterable[Sequence], name: str) -> StreamingResponse:
+    """Build a CSV streaming response from column names and tuple rows."""
     return StreamingResponse(
-        buf,
+        _iter_csv(header, rows),
         media_type="text/csv",
         headers={"Content-Disposition": f'attachment; filename="{name}.csv"'},
     )
@@ -387,14 +464,16 @@ def export_clients(
     db: Database = Depends(get_db),
     site: str = Depends(get_site),
     hours: float = Query(24, ge=0.1, le=8760),
-    format: str = Query("json", pattern=r"^(json|csv)$"),
+    format: ExportFormat = Query("json"),
     limit: int = Query(10000, ge=1, le=10000),
 ) -> Any:
     """Export client data as JSON or CSV."""
-    rows = db.get_clients_export(hours, limit, site=site)
     if format == "csv":
-        return _csv_response(rows, "clients")
-    return rows
+        header, rows = db.iter_clients_export(hours, limit, site=site)
+        return _csv_response(header, rows, "clients")
+    # Serialized to JSON by SQLite: no per-row dicts on the Python side
+    body = db.get_clients_export_json(hours, limit, site=site)
+    return Response(body, media_type="application/json")
 
 
 @router.get("/export/wan")
@@ -402,14 +481,16 @@ def export_wan(
     db: Database = Depends(get_db),
     site: str = Depends(get_site),
     hours: float = Query(24, ge=0.1, le=8760),
-    format: str = Query("json", pattern=r"^(json|csv)$"),
+    format: ExportFormat = Query("json"),
     limit: int = Query(10000, ge=1, le=10000),
 ) -> Any:
     """Export WAN metrics as JSON or CSV."""
-    rows = db.get_wan_export(hours, limit, site=site)
     if format == "csv":
-        return _csv_response(rows, "wan")
-    return rows
+        header, rows = db.iter_wan_export(hours, limit, site=site)
+        return _csv_response(header, rows, "wan")
+    # Serialized to JSON by SQLite: no per-row dicts on the Python side
+    body = db.get_wan_export_json(hours, limit, site=site)
+    return Response(body, media_type="application/json")
 
 
 @router.websocket("/ws")
@@ -418,10 +499,8 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     # Auth check for WebSocket (middleware doesn't intercept WS scope)
     if config.auth_username and config.auth_password:
         token = websocket.query_params.get("token", "")
-        valid = secrets.compare_digest(token, _ws_token(0)) or secrets.compare_digest(
-            token, _ws_token(-1)
-        )
-        if not valid:
+        # One cache lookup for both accepted tokens; comparisons stay constant-time
+        if not any(secrets.compare_digest(token, t) for t in _valid_ws_tokens()):
             await websocket.close(code=4001, reason="Unauthorized")
             return
 
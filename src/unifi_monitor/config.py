@@ -6,17 +6,21 @@ from __future__ import annotations
 
 import logging
 import os
+from dataclasses import dataclass
 from pathlib import Path
 
 from dotenv import load_dotenv
 
 log = logging.getLogger(__name__)
 
-# Walk up from config.py to find .env (supports both src layout and installed)
-_project_root = Path(__file__).resolve().parent.parent.parent
-load_dotenv(_project_root / ".env")
-# Also try cwd (Docker WORKDIR or wherever the user runs from)
-load_dotenv(override=False)
+# Containers that inject env vars directly can set UNIFI_MONITOR_NO_DOTENV=1 to
+# skip both .env lookups at startup.
+if os.getenv("UNIFI_MONITOR_NO_DOTENV") != "1":
+    # Walk up from config.py to find .env (supports both src layout and installed)
+    _project_root = Path(__file__).resolve().parent.parent.parent
+    load_dotenv(_project_root / ".env")
+    # Also try cwd (Docker WORKDIR or wherever the user runs from)
+    load_dotenv(override=False)
 
 
 def _safe_int(
@@ -39,39 +43,68 @@ def _safe_int(
     return val
 
 
+def _sites_from_env() -> list[str]:
+    sites = [s.strip() for s in os.getenv("UNIFI_SITES", "").split(",") if s.strip()]
+    return sites or [os.getenv("UNIFI_SITE", "default")]
+
+
+@dataclass(slots=True)
 class Config:
     # UniFi gateway
-    unifi_host: str = os.getenv("UNIFI_HOST", "192.168.1.1")
-    unifi_username: str = os.getenv("UNIFI_USERNAME", "admin")
-    unifi_password: str = os.getenv("UNIFI_PASSWORD", "")
-    unifi_site: str = os.getenv("UNIFI_SITE", "default")
-    unifi_sites: list[str] = [
-        s.strip() for s in os.getenv("UNIFI_SITES", "").split(",") if s.strip()
-    ] or [os.getenv("UNIFI_SITE", "default")]
-    unifi_port: int = _safe_int("UNIFI_PORT", 443, min_val=1, max_val=65535)
+    unifi_host: str
+    unifi_username: str
+    unifi_password: str
+    unifi_site: str
+    unifi_sites: list[str]
+    unifi_port: int
 
     # Web server
-    web_host: str = os.getenv("WEB_HOST", "0.0.0.0")
-    web_port: int = _safe_int("WEB_PORT", 8080, min_val=1, max_val=65535)
+    web_host: str
+    web_port: int
 
     # NetFlow/IPFIX
-    netflow_enabled: bool = os.getenv("NETFLOW_ENABLED", "true").lower() == "true"
-    netflow_host: str = os.getenv("NETFLOW_HOST", "0.0.0.0")
-    netflow_port: int = _safe_int("NETFLOW_PORT", 2055, min_val=1, max_val=65535)
+    netflow_enabled: bool
+    netflow_host: str
+    netflow_port: int
 
     # Polling
-    poll_interval: int = _safe_int("POLL_INTERVAL", 30, min_val=5)
+    poll_interval: int
 
     # Data retention
-    retention_hours: int = _safe_int("RETENTION_HOURS", 168, min_val=1)
+    retention_hours: int
 
     # Alerts
-    alert_webhook_url: str = os.getenv("ALERT_WEBHOOK_URL", "")
-    alert_cooldown: int = _safe_int("ALERT_COOLDOWN", 300, min_val=30)
+    alert_webhook_url: str
+    alert_cooldown: int
 
     # Authentication (empty = disabled)
-    auth_username: str = os.getenv("AUTH_USERNAME", "")
-    auth_password: str = os.getenv("AUTH_PASSWORD", "")
-
-
-config = Config()
+    auth_username: str
+    auth_password: str
+
+    @classmethod
+    def from_env(cls) -> Config:
+        """Read and validate every setting once from the environment."""
+        return cls(
+            unifi_host=os.getenv("UNIFI_HOST", "192.168.1.1"),
+            unifi_username=os.getenv("UNIFI_USERNAME", "admin"),
+            unifi_password=os.getenv("UNIFI_PASSWORD", ""),
+            unifi_site=os.getenv("UNIFI_SITE", "default"),
+            unifi_sites=_sites_from_env(),
+            unifi_port=_safe_int("UNIFI_PORT", 443, min_val=1, max_val=65535),
+            web_host=os.getenv("WEB_HOST", "0.0.0.0"),
+            web_port=_safe_int("WEB_PORT", 8080, min_val=1, max_val=65535),
+            netflow_enabled=os.getenv("NETFLOW_ENABLED", "true").lower() == "true",
+            netflow_host=os.getenv("NETFLOW_HOST", "0.0.0.0"),
+            netflow_port=_safe_int("NETFLOW_PORT", 2055, min_val=1, max_val=65535),
+            poll_interval=_safe_int("POLL_INTERVAL", 30, min_val=5),
+            retention_hours=_safe_int("RETENTION_HOURS", 168, min_val=1),
+            alert_webhook_url=os.getenv("ALERT_WEBHOOK_URL", ""),
+            alert_cooldown=_safe_int("ALERT_COOLDOWN", 300, min_val=30),
+            auth_username=os.getenv("AUTH_USERNAME", ""),
+            auth_password=os.getenv("AUTH_PASSWORD", ""),
+        )
+
+
+# Not frozen: the auth middleware reads credentials per request so they can be
+# swapped at runtime (tests rely on this).
+config = Config.from_env()
@@ -5,10 +5,13 @@
 from __future__ import annotations
 
 import logging
+import math
 import os
 import sqlite3
 import threading
 import time
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
 from pathlib import Path
 
 log = logging.getLogger(__name__)
@@ -17,6 +20,52 @@ DB_PATH = Path(os.getenv("DB_PATH", "data/monitor.db"))
 
 _VALID_TABLES = frozenset({"wan_metrics", "devices", "clients", "netflow", "alarms"})
 
+# Rows fetched per cursor round trip when streaming exports
+EXPORT_BATCH_SIZE = 500
+
+# Max rows removed per retention-cleanup transaction
+CLEANUP_CHUNK_ROWS = 5000
+# Free pages above this share of the file get fully reclaimed by cleanup()
+VACUUM_FREELIST_RATIO = 0.10
+# A full VACUUM rewrites the whole file under the write lock: at most once a day
+VACUUM_MIN_INTERVAL = 86400
+
+# Insert statements: one shared string per table, so the writer connection's
+# statement cache hits on every batch
+# ORDER BY inside an aggregate needs SQLite 3.44+; older versions aggregate in the
+# subquery's order, which test_export_json_matches_rows pins
+_JSON_AGG_ORDER = " ORDER BY ts DESC" if sqlite3.sqlite_version_info >= (3, 44, 0) else ""
+
+_SQL_INSERT_WAN = "INSERT INTO wan_metrics VALUES (?,?,?,?,?,?,?,?,?)"
+_SQL_INSERT_DEVICES = "INSERT INTO devices VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)"
+_SQL_INSERT_CLIENTS = "INSERT INTO clients VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+_SQL_INSERT_NETFLOW = "INSERT INTO netflow VALUES (?,?,?,?,?,?,?,?,?)"
+_SQL_INSERT_ALARMS = "INSERT INTO alarms VALUES (?,?,?,?,?,?,?)"
+_SQL_UPSERT_NETFLOW_5M = (
+    "INSERT INTO netflow_rollup_5m VALUES (?,?,?,?,?)"
+    " ON CONFLICT(site, bucket) DO UPDATE SET"
+    " total_bytes = total_bytes + excluded.total_bytes,"
+    " total_packets = total_packets + excluded.total_packets,"
+    " flow_count = flow_count + excluded.flow_count"
+)
+
+
+# (divisor, format) indexed by floor(log1024(bytes)), capped at GB
+_BYTE_UNITS = (
+    (1, "{:.0f} B"),
+    (1024, "{:.1f} KB"),
+    (1_048_576, "{:.1f} MB"),
+    (1_073_741_824, "{:.1f} GB"),
+)
+
+
+def _fmt_bytes(b: int | float | None) -> str:
+    """Human-readable byte count. Registered as the `fmt_bytes` SQL function."""
+    if not b:
+        return "0 B"
+    divisor, fmt = _BYTE_UNITS[min(max(int(b).bit_length() - 1, 0) // 10, 3)]
+    return fmt.format(b / divisor)
+
 
 def _dict_factory(cursor: sqlite3.Cursor, row: tuple) -> dict:
     return {col[0]: row[i] for i, col in enumerate(cursor.description)}
@@ -28,20 +77,112 @@ class Database:
         self.path.parent.mkdir(parents=True, exist_ok=True)
         self._local = threading.local()
         self._last_write_ts: float = 0.0
+        self._last_vacuum: float = 0.0
+        # One shared writer connection, serialized in-process: concurrent writers
+        # (poller thread, NetFlow collector, cleanup) queue on a lock instead of
+        # SQLite's sleep-and-retry busy handler. Reads stay on per-thread connections.
+        self._writer = self._connect()
+        # File-format settings persist in the DB file, so only the writer sets them
+        # (on readers journal_mode would wait on an open write transaction). Both
+        # must precede journal_mode on a fresh file (no-op once tables exist):
+        # 8 KiB pages keep the wide netflow covering indexes shallower; incremental
+        # auto_vacuum lets cleanup() hand freed pages back without a full VACUUM.
+        self._writer.execute("PRAGMA page_size=8192")
+        self._writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.row_factory = None  # writes fetch nothing; skip per-row dict builds
+        # Autocommit mode: _write_txn() opens transactions explicitly (BEGIN IMMEDIATE)
+        self._writer.isolation_level = None
+        # Only the writer commits, so only it auto-checkpoints. A larger threshold
+        # (~40 MB of WAL) keeps NetFlow bursts from stalling mid-write on a
+        # checkpoint; cleanup() checkpoints passively on its own schedule.
+        self._writer.execute("PRAGMA wal_autocheckpoint=10000")
+        # ...and a checkpoint that resets the WAL trims the file back to 64 MiB,
+        # so one large cleanup doesn't leave a huge -wal file behind
+        self._writer.execute("PRAGMA journal_size_limit=67108864")
+        # Bound the per-index sampling PRAGMA optimize does on the large netflow table
+        self._writer.execute("PRAGMA analysis_limit=1000")
+        # Re-entrant so insert_* calls can nest inside transaction()
+        self._write_lock = threading.RLock()
+        self._pending_write_ts: float | None = None
         self._init_schema()
 
+    @property
+    def last_write_ts(self) -> float:
+        """Timestamp of the most recent insert (0.0 if nothing written yet)."""
+        return self._last_write_ts
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        conn.row_factory = _dict_factory
+        conn.create_function("fmt_bytes", 1, _fmt_bytes, deterministic=True)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Reads go through the shared OS page cache via mmap; the private
+        # page cache stays modest since every worker thread has its own.
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-16384")
+        # GROUP BY / ORDER BY spill to RAM instead of temp files
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
     @property
     def _conn(self) -> sqlite3.Connection:
+        """Per-thread read connection (query_only: all writes go through _write_txn)."""
         if not hasattr(self._local, "conn") or self._local.conn is None:
-            conn = sqlite3.connect(str(self.path), check_same_thread=False)
-            conn.row_factory = _dict_factory
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.execute("PRAGMA synchronous=NORMAL")
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
             self._local.conn = conn
         return self._local.conn
 
-    def _init_schema(self) -> None:
+    @contextmanager
+    def _write_txn(self, ts: float | None = None) -> Iterator[sqlite3.Connection]:
+        """Hold the writer connection for one transaction (commit on success).
+
+        BEGIN IMMEDIATE takes SQLite's write lock up front, so a transaction never
+        has to upgrade from a read lock (and fail with SQLITE_BUSY) mid-way. Inside
+        transaction() the block joins the open transaction instead. ts, if given,
+        becomes last_write_ts only once committed, so the overview cache never
+        tags uncommitted state.
+        """
+        with self._write_lock:
+            conn = self._writer
+            if conn.in_transaction:
+                # Only this thread can be in one (the lock is held): the outer block commits
+                yield conn
+                if ts is not None:
+                    self._pending_write_ts = ts
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                self._pending_write_ts = None
+                raise
+            conn.commit()
+            if ts is None:
+                ts, self._pending_write_ts = self._pending_write_ts, None
+            if ts is not None:
+                self._last_write_ts = ts
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group several insert_* calls into one transaction (one commit)."""
+        with self._write_txn():
+            yield
+
+    @contextmanager
+    def read_snapshot(self) -> Iterator[None]:
+        """Run several reads on this thread against one snapshot (one read transaction)."""
         conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            conn.commit()
+
+    def _init_schema(self) -> None:
+        conn = self._writer
         conn.executescript("""
             CREATE TABLE IF NOT EXISTS wan_metrics (
                 ts REAL NOT NULL,
@@ -121,15 +262,67 @@ class Database:
 
         # Migrate existing DBs: add site column if missing
         for table in _VALID_TABLES:
-            cols = [r["name"] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+            # table_info rows are (cid, name, type, notnull, dflt_value, pk)
+            cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
             if "site" not in cols:
                 conn.execute(f"ALTER TABLE {table} ADD COLUMN site TEXT NOT NULL DEFAULT 'default'")
 
+        # DBs from before the rollup carry a virtual bucket_300 column and its index.
+        # Nothing reads them any more; the index cost a computed key per insert.
+        nf_cols = [r[1] for r in conn.execute("PRAGMA table_xinfo(netflow)").fetchall()]
+        if "bucket_300" in nf_cols:
+            conn.execute("DROP INDEX IF EXISTS idx_nf_site_bucket")
+            # SQLite < 3.35 can't drop columns; an unindexed virtual one costs nothing
+            with suppress(sqlite3.OperationalError):
+                conn.execute("ALTER TABLE netflow DROP COLUMN bucket_300")
+
+        # 5-minute NetFlow rollup, maintained on insert: bandwidth charts read
+        # O(buckets) rows instead of aggregating raw flows. Backfilled once when
+        # the table is first created on an existing DB.
+        has_rollup = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'netflow_rollup_5m'"
+        ).fetchone()
+        if not has_rollup:
+            conn.executescript("""
+                BEGIN;
+                CREATE TABLE netflow_rollup_5m (
+                    site TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    total_bytes INTEGER NOT NULL,
+                    total_packets INTEGER NOT NULL,
+                    flow_count INTEGER NOT NULL,
+                    PRIMARY KEY (site, bucket)
+                ) WITHOUT ROWID;
+                INSERT INTO netflow_rollup_5m
+                    SELECT site, CAST(ts / 300 AS INTEGER), SUM(bytes), SUM(packets), COUNT(*)
+                    FROM netflow GROUP BY 1, 2;
+                COMMIT;
+            """)
+
+        # json_object(...) over every column, for exports serialized inside SQLite
+        self._json_objects = {
+            table: "json_object("
+            + ", ".join(
+                f"'{r[1]}', \"{r[1]}\"" for r in conn.execute(f"PRAGMA table_info({table})")
+            )
+            + ")"
+            for table in ("clients", "wan_metrics")
+        }
+
         conn.executescript("""
             CREATE INDEX IF NOT EXISTS idx_wan_site_ts ON wan_metrics(site, ts);
             CREATE INDEX IF NOT EXISTS idx_dev_site_ts ON devices(site, ts);
             CREATE INDEX IF NOT EXISTS idx_cli_site_ts ON clients(site, ts);
-            CREATE INDEX IF NOT EXISTS idx_nf_site_ts ON netflow(site, ts);
+            CREATE INDEX IF NOT EXISTS idx_cli_site_ts_rx ON clients(site, ts, rx_bytes);
+            -- Covering indexes: time-window sums, top-N and DNS lookups never touch
+            -- the table. The wide (site, ts, ...) index supersedes the old (site, ts)
+            -- and (site, ts, bytes, packets) ones.
+            DROP INDEX IF EXISTS idx_nf_site_ts;
+            DROP INDEX IF EXISTS idx_nf_site_ts_bytes;
+            CREATE INDEX IF NOT EXISTS idx_nf_site_ts_cover
+                ON netflow(site, ts, src_ip, dst_ip, dst_port, protocol, bytes, packets);
+            CREATE INDEX IF NOT EXISTS idx_nf_site_dns
+                ON netflow(site, dst_port, protocol, ts, src_ip, dst_ip, bytes, packets);
             CREATE INDEX IF NOT EXISTS idx_alarm_site_ts ON alarms(site, ts);
         """)
         conn.commit()
@@ -148,12 +341,11 @@ class Database:
         upload_bps: float | None = None,
         site: str = "default",
     ) -> None:
-        with self._conn:
-            self._conn.execute(
-                "INSERT INTO wan_metrics VALUES (?,?,?,?,?,?,?,?,?)",
+        with self._write_txn(ts) as conn:
+            conn.execute(
+                _SQL_INSERT_WAN,
                 (ts, status, latency_ms, download_bps, upload_bps, wan_ip, cpu_pct, mem_pct, site),
             )
-        self._last_write_ts = ts
 
     def insert_devices(self, ts: float, devices: list[dict], site: str = "default") -> None:
         rows = [
@@ -174,9 +366,8 @@ class Database:
             )
             for d in devices
         ]
-        with self._conn:
-            self._conn.executemany("INSERT INTO devices VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", rows)
-        self._last_write_ts = ts
+        with self._write_txn(ts) as conn:
+            conn.executemany(_SQL_INSERT_DEVICES, rows)
 
     def insert_clients(self, ts: float, clients: list[dict], site: str = "default") -> None:
         rows = [
@@ -199,11 +390,8 @@ class Database:
             )
             for c in clients
         ]
-        with self._conn:
-            self._conn.executemany(
-                "INSERT INTO clients VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", rows
-            )
-        self._last_write_ts = ts
+        with self._write_txn(ts) as conn:
+            conn.executemany(_SQL_INSERT_CLIENTS, rows)
 
     def insert_netflow_batch(self, ts: float, flows: list[dict], site: str = "default") -> None:
         rows = [
@@ -220,9 +408,18 @@ class Database:
             )
             for f in flows
         ]
-        with self._conn:
-            self._conn.executemany("INSERT INTO netflow VALUES (?,?,?,?,?,?,?,?,?)", rows)
-        self._last_write_ts = ts
+        # One ts per batch, so the whole batch lands in a single 5-minute bucket
+        rollup = (
+            site,
+            int(ts // 300),
+            sum(r[6] for r in rows),
+            sum(r[7] for r in rows),
+            len(rows),
+        )
+        with self._write_txn(ts) as conn:
+            conn.executemany(_SQL_INSERT_NETFLOW, rows)
+            if rows:
+                conn.execute(_SQL_UPSERT_NETFLOW_5M, rollup)
 
     def insert_alarms(self, ts: float, alarms: list[dict], site: str = "default") -> None:
         rows = [
@@ -237,9 +434,8 @@ class Database:
             )
             for a in alarms
         ]
-        with self._conn:
-            self._conn.executemany("INSERT INTO alarms VALUES (?,?,?,?,?,?,?)", rows)
-        self._last_write_ts = ts
+        with self._write_txn(ts) as conn:
+            conn.executemany(_SQL_INSERT_ALARMS, rows)
 
     # -- Read methods --
 
@@ -256,25 +452,54 @@ class Database:
         ).fetchone()
 
     def get_latest_devices(self, site: str = "default") -> list[dict]:
-        latest_ts = self._conn.execute(
-            "SELECT MAX(ts) as ts FROM devices WHERE site = ?", (site,)
-        ).fetchone()
-        if not latest_ts or not latest_ts["ts"]:
-            return []
         return self._conn.execute(
-            "SELECT * FROM devices WHERE ts = ? AND site = ?", (latest_ts["ts"], site)
+            "SELECT * FROM devices"
+            " WHERE site = ? AND ts = (SELECT MAX(ts) FROM devices WHERE site = ?)",
+            (site, site),
         ).fetchall()
 
     def get_latest_clients(self, site: str = "default") -> list[dict]:
-        latest_ts = self._conn.execute(
-            "SELECT MAX(ts) as ts FROM clients WHERE site = ?", (site,)
-        ).fetchone()
-        if not latest_ts or not latest_ts["ts"]:
-            return []
         return self._conn.execute(
-            "SELECT * FROM clients WHERE ts = ? AND site = ?", (latest_ts["ts"], site)
+            "SELECT * FROM clients"
+            " WHERE site = ? AND ts = (SELECT MAX(ts) FROM clients WHERE site = ?)",
+            (site, site),
         ).fetchall()
 
+    def get_latest_clients_page(
+        self, offset: int = 0, limit: int = 50, site: str = "default"
+    ) -> list[dict]:
+        """Latest client snapshot sorted by rx_bytes desc, paginated in SQL."""
+        return self._conn.execute(
+            "SELECT * FROM clients"
+            " WHERE site = ? AND ts = (SELECT MAX(ts) FROM clients WHERE site = ?)"
+            " ORDER BY rx_bytes DESC LIMIT ? OFFSET ?",
+            (site, site, limit, offset),
+        ).fetchall()
+
+    def count_latest_clients(self, site: str = "default") -> int:
+        row = self._conn.execute(
+            "SELECT COUNT(*) as cnt FROM clients"
+            " WHERE site = ? AND ts = (SELECT MAX(ts) FROM clients WHERE site = ?)",
+            (site, site),
+        ).fetchone()
+        return row["cnt"] if row else 0
+
+    def get_latest_device_counts(self, site: str = "default") -> dict:
+        """Total and online device counts for the latest snapshot, aggregated in SQL."""
+        return self._conn.execute(
+            "SELECT COUNT(*) as total, COALESCE(SUM(state = 1), 0) as online FROM devices"
+            " WHERE site = ? AND ts = (SELECT MAX(ts) FROM devices WHERE site = ?)",
+            (site, site),
+        ).fetchone()
+
+    def get_latest_client_counts(self, site: str = "default") -> dict:
+        """Total and wired client counts for the latest snapshot, aggregated in SQL."""
+        return self._conn.execute(
+            "SELECT COUNT(*) as total, COALESCE(SUM(is_wired != 0), 0) as wired FROM clients"
+            " WHERE site = ? AND ts = (SELECT MAX(ts) FROM clients WHERE site = ?)",
+            (site, site),
+        ).fetchone()
+
     def get_client_history(self, mac: str, hours: float = 24, site: str = "default") -> list[dict]:
         cutoff = time.time() - (hours * 3600)
         return self._conn.execute(
@@ -288,7 +513,7 @@ class Database:
         cutoff = time.time() - (hours * 3600)
         return self._conn.execute(
             """SELECT src_ip, SUM(bytes) as total_bytes, SUM(packets) as total_packets,
-                      COUNT(*) as flow_count
+                      COUNT(*) as flow_count, fmt_bytes(SUM(bytes)) as total_bytes_fmt
                FROM netflow WHERE ts > ? AND site = ?
                GROUP BY src_ip ORDER BY total_bytes DESC LIMIT ?""",
             (cutoff, site, limit),
@@ -300,7 +525,7 @@ class Database:
         cutoff = time.time() - (hours * 3600)
         return self._conn.execute(
             """SELECT dst_ip, SUM(bytes) as total_bytes, SUM(packets) as total_packets,
-                      COUNT(*) as flow_count
+                      COUNT(*) as flow_count, fmt_bytes(SUM(bytes)) as total_bytes_fmt
                FROM netflow WHERE ts > ? AND site = ?
                GROUP BY dst_ip ORDER BY total_bytes DESC LIMIT ?""",
             (cutoff, site, limit),
@@ -309,7 +534,8 @@ class Database:
     def get_top_ports(self, hours: float = 1, limit: int = 20, site: str = "default") -> list[dict]:
         cutoff = time.time() - (hours * 3600)
         return self._conn.execute(
-            """SELECT dst_port, protocol, SUM(bytes) as total_bytes, COUNT(*) as flow_count
+            """SELECT dst_port, protocol, SUM(bytes) as total_bytes, COUNT(*) as flow_count,
+                      fmt_bytes(SUM(bytes)) as total_bytes_fmt
                FROM netflow WHERE ts > ? AND site = ?
                GROUP BY dst_port, protocol ORDER BY total_bytes DESC LIMIT ?""",
             (cutoff, site, limit),
@@ -321,7 +547,7 @@ class Database:
         cutoff = time.time() - (hours * 3600)
         return self._conn.execute(
             """SELECT src_ip, dst_ip, SUM(bytes) as total_bytes, SUM(packets) as total_packets,
-                      COUNT(*) as query_count
+                      COUNT(*) as query_count, fmt_bytes(SUM(bytes)) as total_bytes_fmt
                FROM netflow WHERE ts > ? AND dst_port IN (53, 853) AND protocol IN (6, 17)
                    AND site = ?
                GROUP BY src_ip, dst_ip ORDER BY query_count DESC LIMIT ?""",
@@ -334,7 +560,7 @@ class Database:
         cutoff = time.time() - (hours * 3600)
         return self._conn.execute(
             """SELECT src_ip, SUM(bytes) as total_bytes, SUM(packets) as total_packets,
-                      COUNT(*) as query_count
+                      COUNT(*) as query_count, fmt_bytes(SUM(bytes)) as total_bytes_fmt
                FROM netflow WHERE ts > ? AND dst_port IN (53, 853) AND protocol IN (6, 17)
                    AND site = ?
                GROUP BY src_ip ORDER BY query_count DESC LIMIT ?""",
@@ -347,7 +573,7 @@ class Database:
         cutoff = time.time() - (hours * 3600)
         return self._conn.execute(
             """SELECT dst_ip, SUM(bytes) as total_bytes, SUM(packets) as total_packets,
-                      COUNT(*) as query_count
+                      COUNT(*) as query_count, fmt_bytes(SUM(bytes)) as total_bytes_fmt
                FROM netflow WHERE ts > ? AND dst_port IN (53, 853) AND protocol IN (6, 17)
                    AND site = ?
                GROUP BY dst_ip ORDER BY query_count DESC LIMIT ?""",
@@ -357,25 +583,36 @@ class Database:
     def get_bandwidth_timeseries(
         self, hours: float = 24, bucket_minutes: int = 5, site: str = "default"
     ) -> list[dict]:
-        cutoff = time.time() - (hours * 3600)
         bucket_secs = bucket_minutes * 60
+        # Whole buckets only: the window starts at the first bucket boundary inside
+        # it, so the partial bucket straddling the cutoff is skipped on both paths
+        start = math.ceil((time.time() - hours * 3600) / bucket_secs) * bucket_secs
+        if bucket_secs % 300 == 0:
+            # Whole 5-minute multiples come from the rollup
+            per = bucket_secs // 300
+            return self._conn.execute(
+                "SELECT bucket / ? * ? as bucket,"
+                "       SUM(total_bytes) as total_bytes, SUM(total_packets) as total_packets,"
+                "       ROUND(SUM(total_bytes) * 8.0 / ?, 2) as mbps"
+                " FROM netflow_rollup_5m WHERE site = ? AND bucket >= ?"
+                " GROUP BY 1 ORDER BY 1",
+                (per, bucket_secs, bucket_secs * 1_000_000, site, start // 300),
+            ).fetchall()
         return self._conn.execute(
             "SELECT CAST(ts / ? AS INTEGER) * ? as bucket,"
-            "       SUM(bytes) as total_bytes, SUM(packets) as total_packets"
-            " FROM netflow WHERE ts > ? AND site = ?"
+            "       SUM(bytes) as total_bytes, SUM(packets) as total_packets,"
+            "       ROUND(SUM(bytes) * 8.0 / ?, 2) as mbps"
+            " FROM netflow WHERE ts >= ? AND site = ?"
             " GROUP BY bucket ORDER BY bucket",
-            (bucket_secs, bucket_secs, cutoff, site),
+            (bucket_secs, bucket_secs, bucket_secs * 1_000_000, start, site),
         ).fetchall()
 
     def get_active_alarms(self, site: str = "default") -> list[dict]:
-        latest_ts = self._conn.execute(
-            "SELECT MAX(ts) as ts FROM alarms WHERE site = ?", (site,)
-        ).fetchone()
-        if not latest_ts or not latest_ts["ts"]:
-            return []
         return self._conn.execute(
-            "SELECT * FROM alarms WHERE ts = ? AND archived = 0 AND site = ?",
-            (latest_ts["ts"], site),
+            "SELECT * FROM alarms"
+            " WHERE site = ? AND ts = (SELECT MAX(ts) FROM alarms WHERE site = ?)"
+            " AND archived = 0",
+            (site, site),
         ).fetchall()
 
     def get_clients_export(
@@ -396,6 +633,85 @@ class Database:
             (cutoff, site, limit),
         ).fetchall()
 
+    def get_clients_export_json(
+        self, hours: float = 24, limit: int = 10000, site: str = "default"
+    ) -> str:
+        """get_clients_export() rows as a JSON array string, built by SQLite's JSON1."""
+        cutoff = time.time() - (hours * 3600)
+        return self._json_array(
+            "clients", "WHERE ts > ? AND site = ? ORDER BY ts DESC LIMIT ?", (cutoff, site, limit)
+        )
+
+    def get_wan_export_json(
+        self, hours: float = 24, limit: int = 10000, site: str = "default"
+    ) -> str:
+        """get_wan_export() rows as a JSON array string, built by SQLite's JSON1."""
+        cutoff = time.time() - (hours * 3600)
+        return self._json_array(
+            "wan_metrics",
+            "WHERE ts > ? AND site = ? ORDER BY ts DESC LIMIT ?",
+            (cutoff, site, limit),
+        )
+
+    def _json_array(self, table: str, clause: str, params: tuple) -> str:
+        # Newest first, like the row exports. JSON1 renders REALs with 15
+        # significant digits, so ts keeps 10 us resolution.
+        row = self._conn.execute(
+            f"SELECT json_group_array({self._json_objects[table]}{_JSON_AGG_ORDER}) as rows"
+            f" FROM (SELECT * FROM {table} {clause})",
+            params,
+        ).fetchone()
+        return row["rows"]
+
+    def iter_clients_export(
+        self, hours: float = 24, limit: int = 10000, site: str = "default"
+    ) -> tuple[list[str], Iterator[tuple]]:
+        """Column names plus a lazy tuple-row iterator, for streamed CSV export."""
+        cutoff = time.time() - (hours * 3600)
+        return self._iter_tuples(
+            "SELECT * FROM clients WHERE ts > ? AND site = ? ORDER BY ts DESC LIMIT ?",
+            (cutoff, site, limit),
+        )
+
+    def iter_wan_export(
+        self, hours: float = 24, limit: int = 10000, site: str = "default"
+    ) -> tuple[list[str], Iterator[tuple]]:
+        """Column names plus a lazy tuple-row iterator, for streamed CSV export."""
+        cutoff = time.time() - (hours * 3600)
+        return self._iter_tuples(
+            "SELECT * FROM wan_metrics WHERE ts > ? AND site = ? ORDER BY ts DESC LIMIT ?",
+            (cutoff, site, limit),
+        )
+
+    def _iter_tuples(self, sql: str, params: tuple) -> tuple[list[str], Iterator[tuple]]:
+        """Run sql on a connection of its own and return (header, lazy row iterator).
+
+        The iterator is handed off: StreamingResponse advances it on threadpool
+        threads, so it can't borrow the calling thread's read connection. The
+        connection closes once the rows run out or the iterator is dropped (an
+        abandoned download), so an open cursor doesn't pin a WAL snapshot.
+        """
+        conn = self._connect()
+        conn.execute("PRAGMA query_only=1")
+        try:
+            # Plain tuples (no dict factory), pulled from the cursor in batches
+            cur = conn.cursor()
+            cur.row_factory = None
+            cur.execute(sql, params)
+            header = [col[0] for col in cur.description]
+        except BaseException:
+            conn.close()
+            raise
+
+        def rows() -> Iterator[tuple]:
+            try:
+                while batch := cur.fetchmany(EXPORT_BATCH_SIZE):
+                    yield from batch
+            finally:
+                conn.close()
+
+        return header, rows()
+
     # -- Historical comparison --
 
     def get_comparison(
@@ -503,12 +819,19 @@ class Database:
             },
         }
 
-    def get_db_stats(self) -> dict:
-        """Return row counts per table, DB file size, and last write timestamp."""
+    def get_db_stats(self, counts: bool = True) -> dict:
+        """Return row counts per table, DB file size, and last write timestamp.
+
+        counts=False skips the per-table COUNT(*) scans (O(rows) on netflow) and
+        only probes that the database is readable.
+        """
         stats: dict = {"last_write_ts": self._last_write_ts}
-        for table in _VALID_TABLES:
-            row = self._conn.execute(f"SELECT COUNT(*) as cnt FROM {table}").fetchone()
-            stats[f"{table}_rows"] = row["cnt"] if row else 0
+        if counts:
+            for table in _VALID_TABLES:
+                row = self._conn.execute(f"SELECT COUNT(*) as cnt FROM {table}").fetchone()
+                stats[f"{table}_rows"] = row["cnt"] if row else 0
+        else:
+            self._conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
         try:
             stats["db_size_bytes"] = self.path.stat().st_size
         except OSError:
@@ -519,8 +842,50 @@ class Database:
 
     def cleanup(self, retention_hours: int = 168) -> None:
         cutoff = time.time() - (retention_hours * 3600)
+        # Delete in bounded chunks, one transaction each, so poller and NetFlow
+        # writes interleave instead of waiting out one huge DELETE.
         for table in _VALID_TABLES:
-            self._conn.execute(f"DELETE FROM {table} WHERE ts < ?", (cutoff,))
-        self._conn.commit()
-        self._conn.execute("PRAGMA optimize")
+            while True:
+                with self._write_txn() as conn:
+                    deleted = conn.execute(
+                        f"DELETE FROM {table} WHERE rowid IN"
+                        f" (SELECT rowid FROM {table} WHERE ts < ? LIMIT ?)",
+                        (cutoff, CLEANUP_CHUNK_ROWS),
+                    ).rowcount
+                if deleted < CLEANUP_CHUNK_ROWS:
+                    break
+        with self._write_txn() as conn:
+            # The bucket straddling the cutoff goes too: its raw rows are partly deleted,
+            # and the timeseries skips partial buckets anyway
+            conn.execute(
+                "DELETE FROM netflow_rollup_5m WHERE bucket < ?", (math.ceil(cutoff / 300),)
+            )
+        with self._write_lock:
+            self._reclaim_free_pages()
+            self._writer.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self._writer.execute("PRAGMA optimize")
         log.info("DB cleanup: removed data older than %dh", retention_hours)
+
+    def _reclaim_free_pages(self) -> None:
+        """Return freed pages to the OS; caller holds the write lock."""
+        conn = self._writer
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        fragmented = freelist > pages * VACUUM_FREELIST_RATIO
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # DB predates auto_vacuum=INCREMENTAL: a full VACUUM also converts it
+            if fragmented and time.time() - self._last_vacuum >= VACUUM_MIN_INTERVAL:
+                log.info("DB cleanup: VACUUM (%d of %d pages free)", freelist, pages)
+                conn.execute("VACUUM")
+                self._last_vacuum = time.time()
+            return
+        # executescript steps the pragma to completion; execute() frees one page
+        conn.executescript(
+            "PRAGMA incremental_vacuum;" if fragmented else "PRAGMA incremental_vacuum(1000);"
+        )
+
+    def close(self) -> None:
+        """Refresh planner statistics and close the writer. Call once, at shutdown."""
+        with self._write_lock:
+            self._writer.execute("PRAGMA optimize")
+            self._writer.close()
@@ -4,10 +4,12 @@
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
+import contextlib
 import logging
 import sqlite3
-import threading
 import time
+from collections import deque
 
 from ..db import Database
 from .parser import parse_packet
@@ -15,21 +17,50 @@ from .parser import parse_packet
 log = logging.getLogger(__name__)
 
 MAX_PACKET_SIZE = 65535
+# Flush early once this many flows are buffered: bounds memory and commit size
+MAX_BATCH_FLOWS = 5000
+# Writes queued behind the DB thread; further slices wait in the protocol's buffer,
+# which holds at most MAX_PENDING_FLUSHES * batch_max_flows flows (the rest are dropped)
+MAX_PENDING_FLUSHES = 4
 
 
 class NetFlowProtocol(asyncio.DatagramProtocol):
-    """Asyncio UDP protocol for NetFlow/IPFIX packets."""
-
-    def __init__(self, db: Database, batch_interval: float = 10.0, site: str = "default") -> None:
+    """Asyncio UDP protocol for NetFlow/IPFIX packets.
+
+    Every callback (and the periodic flush task) runs on the event loop thread,
+    so the batch buffer needs no lock. Batches are written on a single-thread
+    executor so a commit never stalls packet reception.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        batch_interval: float = 10.0,
+        site: str = "default",
+        batch_max_flows: int = MAX_BATCH_FLOWS,
+    ) -> None:
         self.db = db
         self.site = site
         self.templates: dict = {"netflow": {}, "ipfix": {}}
         self.batch: list[dict] = []
-        self._lock = threading.Lock()
         self.batch_interval = batch_interval
+        self.batch_max_flows = batch_max_flows
         self._last_flush = time.time()
         self._packets = 0
         self._flows = 0
+        # One worker: writes stay in order and SQLite sees a single writer
+        self._db_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="nf-writer"
+        )
+        self._pending: set[asyncio.Future] = set()
+        # Sealed (flush ts, flows) slices waiting for a free pending slot
+        self._held: deque[tuple[float, list[dict]]] = deque()
+        self._held_flows = 0
+        self._max_buffered = MAX_PENDING_FLUSHES * batch_max_flows
+        self._dropped = 0
+        self._closed = False
+        # Interval flush task, set by start_collector() and cancelled by aclose()
+        self._flush_task: asyncio.Task | None = None
 
     def datagram_received(self, data: bytes, addr: tuple) -> None:
         if len(data) > MAX_PACKET_SIZE:
@@ -39,29 +70,71 @@ class NetFlowProtocol(asyncio.DatagramProtocol):
         self._packets += 1
         flows = parse_packet(data, self.templates)
         if flows:
-            with self._lock:
-                self.batch.extend(flows)
-                self._flows += len(flows)
-
-        # Flush batch periodically
+            self._flows += len(flows)
+            # Bounded while the writer is behind: drop what doesn't fit (logged on flush)
+            room = self._max_buffered - len(self.batch) - self._held_flows
+            if len(flows) > room:
+                self._dropped += len(flows) - max(room, 0)
+                flows = flows[: max(room, 0)]
+            self.batch.extend(flows)
+
+        # Flush batch periodically, or as soon as a burst fills it
         now = time.time()
-        if now - self._last_flush >= self.batch_interval:
+        if now - self._last_flush >= self.batch_interval or len(self.batch) >= self.batch_max_flows:
             self._flush(now)
 
-    def _flush(self, ts: float) -> None:
-        with self._lock:
-            if not self.batch:
-                return
-            batch_copy = list(self.batch)
-            self.batch.clear()
+    def _flush(self, ts: float, force: bool = False) -> None:
+        if self._closed:
+            return
+        if self._dropped:
+            log.warning("NetFlow DB writer behind: dropped %d flows", self._dropped)
+            self._dropped = 0
+        # Seal the batch under this flush's ts in writer-sized slices (one commit
+        # each), so flows held back by a busy writer keep their own interval's ts
+        batch, self.batch = self.batch, []
+        step = self.batch_max_flows
+        for start in range(0, len(batch), step):
+            self._held.append((ts, batch[start : start + step]))
+        self._held_flows += len(batch)
         self._last_flush = ts
-        try:
-            self.db.insert_netflow_batch(ts, batch_copy, site=self.site)
-        except sqlite3.OperationalError as e:
-            log.warning("NetFlow DB write error: %s", e)
+        self._submit_held(force)
+
+    def _submit_held(self, force: bool = False) -> None:
+        # Backpressure: at most MAX_PENDING_FLUSHES writes queued behind the DB thread
+        loop = asyncio.get_running_loop()
+        while self._held and (force or len(self._pending) < MAX_PENDING_FLUSHES):
+            ts, flows = self._held.popleft()
+            self._held_flows -= len(flows)
+            fut = loop.run_in_executor(
+                self._db_executor, self.db.insert_netflow_batch, ts, flows, self.site
+            )
+            self._pending.add(fut)
+            fut.add_done_callback(self._write_done)
+
+    def _write_done(self, fut: asyncio.Future) -> None:
+        self._pending.discard(fut)
+        if not self._closed:
+            self._submit_held()
+        exc = fut.exception()
+        if isinstance(exc, sqlite3.OperationalError):
+            log.warning("NetFlow DB write error: %s", exc)
+        elif exc is not None:
+            log.error("NetFlow DB write failed", exc_info=exc)
 
     def connection_lost(self, exc: Exception | None) -> None:
-        self._flush(time.time())
+        self._flush(time.time(), force=True)
+
+    async def aclose(self) -> None:
+        """Write out buffered flows and wait for in-flight writes. Called on shutdown."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+        self._flush(time.time(), force=True)
+        self._closed = True
+        if self._pending:
+            await asyncio.wait(self._pending)
+        self._db_executor.shutdown()
 
 
 async def start_collector(
@@ -81,5 +154,5 @@ async def start_collector(
             await asyncio.sleep(protocol.batch_interval)
             protocol._flush(time.time())
 
-    asyncio.create_task(periodic_flush())
+    protocol._flush_task = asyncio.create_task(periodic_flush())
     return transport
@@ -8,24 +8,74 @@ from __future__ import annotations
 import logging
 import socket
 import struct
+from functools import lru_cache
 
 import netflow
-from netflow.ipfix import IPFIXHeader, IPFIXSet, IPFIXTemplateError, IPFIXTemplateNotRecognized
+from netflow.ipfix import (
+    IPFIXHeader,
+    IPFIXSet,
+    IPFIXTemplateError,
+    IPFIXTemplateNotRecognized,
+    TemplateFieldEnterprise,
+)
 
 log = logging.getLogger(__name__)
 
 PROTO_MAP = {1: "ICMP", 6: "TCP", 17: "UDP", 47: "GRE", 50: "ESP", 58: "ICMPv6"}
 
-
+_U32 = struct.Struct("!I")
+_VERSION = struct.Struct("!H")
+_SET_HEADER = struct.Struct("!HH")  # set id, set length
+
+# IANA IPFIX element IDs read by extract_flow_fields; everything else is skipped
+_IPFIX_FIELD_NAMES = {
+    1: "octetDeltaCount",
+    2: "packetDeltaCount",
+    4: "protocolIdentifier",
+    7: "sourceTransportPort",
+    8: "sourceIPv4Address",
+    11: "destinationTransportPort",
+    12: "destinationIPv4Address",
+    27: "sourceIPv6Address",
+    28: "destinationIPv6Address",
+    60: "ipVersion",
+}
+_UINT_FORMATS = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+# Attributes extract_flow_fields reads from flow objects that carry no .data dict
+_FLOW_ATTRS = (
+    "ipVersion",
+    "sourceIPv4Address",
+    "destinationIPv4Address",
+    "sourceIPv6Address",
+    "destinationIPv6Address",
+    "sourceTransportPort",
+    "destinationTransportPort",
+    "protocolIdentifier",
+    "octetDeltaCount",
+    "packetDeltaCount",
+    "IPV4_SRC_ADDR",
+    "IPV4_DST_ADDR",
+    "L4_SRC_PORT",
+    "L4_DST_PORT",
+    "PROTOCOL",
+    "IN_BYTES",
+    "IN_PKTS",
+)
+
+
+# Flows repeat a small set of LAN/server addresses, so conversions are memoized
+@lru_cache(maxsize=16384)
 def int_to_ipv4(val: int) -> str:
     if val == 0:
         return "0.0.0.0"
     try:
-        return socket.inet_ntoa(struct.pack("!I", val & 0xFFFFFFFF))
+        return socket.inet_ntoa(_U32.pack(val & 0xFFFFFFFF))
     except (struct.error, OSError):
         return str(val)
 
 
+@lru_cache(maxsize=16384)
 def int_to_ipv6(val: int) -> str:
     if val == 0:
         return "::"
@@ -39,7 +89,7 @@ def extract_flow_fields(flow) -> dict:
     """Normalize a parsed flow record into a flat dict."""
     data = flow.data if hasattr(flow, "data") else flow
     if not isinstance(data, dict):
-        data = {a: getattr(flow, a) for a in dir(flow) if not a.startswith("_")} if flow else {}
+        data = {a: getattr(flow, a) for a in _FLOW_ATTRS if hasattr(flow, a)} if flow else {}
 
     ip_ver = data.get("ipVersion", 4)
     if ip_ver == 6:
@@ -64,6 +114,50 @@ def extract_flow_fields(flow) -> dict:
     }
 
 
+def _compile_ipfix_template(fields: list) -> tuple[struct.Struct, tuple, tuple] | None:
+    """Build one struct for a template's data records, or None to use IPFIXSet.
+
+    Returns (struct, field names, names unpacked as bytes). Unused fields become
+    pad bytes; variable-length fields or odd widths fall back to the library.
+    """
+    fmt = "!"
+    names: list[str] = []
+    wide: list[str] = []
+    for field in fields:
+        if field.length == 65535:
+            return None
+        name = _IPFIX_FIELD_NAMES.get(field.id)
+        if isinstance(field, TemplateFieldEnterprise):
+            name = None  # vendor element: same id, different meaning
+        if name is None:
+            fmt += f"{field.length}x"
+        elif field.length in _UINT_FORMATS:
+            fmt += _UINT_FORMATS[field.length]
+            names.append(name)
+        elif field.length == 16:
+            fmt += "16s"
+            names.append(name)
+            wide.append(name)
+        else:
+            return None
+    compiled = struct.Struct(fmt)
+    return (compiled, tuple(names), tuple(wide)) if compiled.size else None
+
+
+def _decode_ipfix_records(
+    compiled: tuple[struct.Struct, tuple, tuple], body: bytes | memoryview
+) -> list[dict]:
+    unpacker, names, wide = compiled
+    records = []
+    # Trailing bytes shorter than one record are set padding
+    for values in unpacker.iter_unpack(body[: len(body) - len(body) % unpacker.size]):
+        record = dict(zip(names, values, strict=True))
+        for name in wide:
+            record[name] = int.from_bytes(record[name], "big")
+        records.append(record)
+    return records
+
+
 def parse_packet(data: bytes, templates: dict) -> list[dict]:
     """Parse a NetFlow/IPFIX UDP packet into a list of flow dicts.
 
@@ -78,7 +172,7 @@ def parse_packet(data: bytes, templates: dict) -> list[dict]:
     if len(data) < 4:
         return []
 
-    version = struct.unpack("!H", data[:2])[0]
+    version = _VERSION.unpack_from(data)[0]
     if version == 10:
         return _parse_ipfix(data, templates)
     else:
@@ -96,6 +190,9 @@ def _parse_netflow(data: bytes, templates: dict) -> list[dict]:
 
 def _parse_ipfix(data: bytes, templates: dict) -> list[dict]:
     ipfix_templates = templates.setdefault("ipfix", {})
+    # template id -> (template fields, compiled decoder or None); stale once the
+    # template is redefined, since the library stores a new fields list
+    ipfix_compiled = templates.setdefault("ipfix_compiled", {})
 
     if len(data) < IPFIXHeader.size:
         return []
@@ -103,19 +200,32 @@ def _parse_ipfix(data: bytes, templates: dict) -> list[dict]:
     header = IPFIXHeader(data[: IPFIXHeader.size])
     offset = IPFIXHeader.size
     flows = []
+    # Sets are sliced as zero-copy views; only the IPFIXSet fallback needs bytes
+    view = memoryview(data)
 
     while offset < header.length and offset < len(data):
         if offset + 4 > len(data):
             break
-        set_id, set_len = struct.unpack("!HH", data[offset : offset + 4])
+        set_id, set_len = _SET_HEADER.unpack_from(data, offset)
         if set_len < 4:
             break
 
-        set_data = data[offset : offset + set_len]
+        set_data = view[offset : offset + set_len]
         offset += set_len
 
+        fields = ipfix_templates.get(set_id) if set_id >= 256 else None
+        if fields:
+            cached = ipfix_compiled.get(set_id)
+            if cached is None or cached[0] is not fields:
+                cached = ipfix_compiled[set_id] = (fields, _compile_ipfix_template(fields))
+            if cached[1] is not None:
+                flows.extend(
+                    extract_flow_fields(r) for r in _decode_ipfix_records(cached[1], set_data[4:])
+                )
+                continue
+
         try:
-            ipfix_set = IPFIXSet(set_data, ipfix_templates)
+            ipfix_set = IPFIXSet(bytes(set_data), ipfix_templates)
             if ipfix_set.is_template:
                 ipfix_templates.update(ipfix_set.templates)
                 for tid in list(ipfix_templates):
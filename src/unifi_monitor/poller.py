@@ -11,12 +11,20 @@ import time
 from collections.abc import Callable
 from typing import Any
 
+import httpx
+
 from .config import config
 from .db import Database
 from .unifi_client import UnifiAPIError, UnifiAuthError, UnifiClient
 
 log = logging.getLogger(__name__)
 
+# Errors that fail one endpoint's fetch without being a bug
+_FETCH_ERRORS = (UnifiAPIError, UnifiAuthError, httpx.HTTPError, ConnectionError, TimeoutError)
+
+# (endpoint name, store method, raw response) for one fetched endpoint
+_Fetched = tuple[str, Callable[[float, list[dict]], None], list[dict]]
+
 
 def _safe_int(val: object) -> int | None:
     if val is None:
@@ -137,54 +145,76 @@ class Poller:
         self._running = True
         log.info("Poller started (interval=%ds)", config.poll_interval)
 
-        while self._running:
-            try:
-                await asyncio.to_thread(self._poll_cycle)
-            except (UnifiAPIError, UnifiAuthError, ConnectionError, TimeoutError, sqlite3.OperationalError, KeyError, TypeError, ValueError) as e:
-                log.warning("Poll cycle error: %s", e)
-
-            # Broadcast snapshot to WebSocket clients + evaluate alerts
-            try:
-                snapshot = self._build_snapshot()
-                if self._broadcast_fn and snapshot:
-                    await self._broadcast_fn(snapshot)
-                if self._alert_engine and snapshot:
-                    fired = self._alert_engine.evaluate(snapshot)
-                    if fired:
-                        await self._alert_engine.notify(fired)
-            except (ConnectionError, RuntimeError, TypeError, ValueError) as e:
-                log.debug("Post-cycle broadcast/alert error: %s", e)
-
-            await asyncio.sleep(config.poll_interval)
+        try:
+            while self._running:
+                try:
+                    await self._poll_cycle()
+                except (
+                    *_FETCH_ERRORS,
+                    sqlite3.OperationalError,
+                    KeyError,
+                    TypeError,
+                    ValueError,
+                ) as e:
+                    log.warning("Poll cycle error: %s", e)
+
+                # Broadcast snapshot to WebSocket clients + evaluate alerts.
+                # The four snapshot reads run off the event loop, like the DB writes.
+                try:
+                    snapshot = await asyncio.to_thread(self._build_snapshot)
+                    if self._broadcast_fn and snapshot:
+                        await self._broadcast_fn(snapshot)
+                    if self._alert_engine and snapshot:
+                        fired = self._alert_engine.evaluate(snapshot)
+                        if fired:
+                            await self._alert_engine.notify(fired)
+                except (ConnectionError, RuntimeError, TypeError, ValueError) as e:
+                    log.debug("Post-cycle broadcast/alert error: %s", e)
+
+                await asyncio.sleep(config.poll_interval)
+        finally:
+            # Here rather than in stop(), which can land mid-cycle
+            await self.client.aclose()
 
     def stop(self) -> None:
         self._running = False
-        self.client.close()
 
-    def _poll_cycle(self) -> None:
+    async def _poll_cycle(self) -> None:
         ts = time.time()
         self._cycle_count += 1
-        self.client.ensure_auth()
+        await self.client.ensure_auth()
 
         poll_methods = [
-            ("health", self._poll_health),
-            ("devices", self._poll_devices),
-            ("clients", self._poll_clients),
-            ("alarms", self._poll_alarms),
+            ("health", self.client.get_health, self._store_health),
+            ("devices", self.client.get_devices, self._store_devices),
+            ("clients", self.client.get_clients, self._store_clients),
+            ("alarms", self.client.get_alarms, self._store_alarms),
         ]
 
-        for name, method in poll_methods:
-            try:
-                method(ts)
-                self._success_count += 1
-            except (UnifiAPIError, UnifiAuthError) as e:
-                log.warning("%s poll failed: %s", name.capitalize(), e)
+        # The endpoints are independent: fetch them concurrently (one round trip of
+        # latency per cycle instead of four), then parse and store in order
+        results = await asyncio.gather(
+            *(fetch() for _, fetch, _ in poll_methods), return_exceptions=True
+        )
+
+        # Settle every fetch before the DB write, so a transport error on one
+        # endpoint can't roll back the others
+        responses: list[_Fetched] = []
+        for (name, _, store), result in zip(poll_methods, results, strict=True):
+            if isinstance(result, _FETCH_ERRORS):
+                log.warning("%s poll failed: %s", name.capitalize(), result)
 
                 self._error_count += 1
-            except (sqlite3.OperationalError, KeyError, TypeError, ValueError) as e:
-                log.warning("%s poll failed (unexpected): %s", name.capitalize(), e)
+            elif isinstance(result, (KeyError, TypeError, ValueError)):
+                log.warning("%s poll failed (unexpected): %s", name.capitalize(), result)
 
                 self._error_count += 1
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                responses.append((name, store, result))
+
+        await asyncio.to_thread(self._store_cycle, ts, responses)
 
         if self._cycle_count % 10 == 0:
             log.info(
@@ -194,8 +224,19 @@ class Poller:
                 self._error_count,
             )
 
-    def _poll_health(self, ts: float) -> None:
-        health = self.client.get_health()
+    def _store_cycle(self, ts: float, responses: list[_Fetched]) -> None:
+        # Parse and commit the cycle's inserts together, off the event loop
+        with self.db.transaction():
+            for name, store, raw in responses:
+                try:
+                    store(ts, raw)
+                    self._success_count += 1
+                except (sqlite3.OperationalError, KeyError, TypeError, ValueError) as e:
+                    log.warning("%s poll failed (unexpected): %s", name.capitalize(), e)
+
+                    self._error_count += 1
+
+    def _store_health(self, ts: float, health: list[dict]) -> None:
         wan = _parse_wan(health)
         if wan:
             self.db.insert_wan(
@@ -210,20 +251,17 @@ class Poller:
                 site=self.site,
             )
 
-    def _poll_devices(self, ts: float) -> None:
-        raw = self.client.get_devices()
+    def _store_devices(self, ts: float, raw: list[dict]) -> None:
         devices = [d for d in (_parse_device(r) for r in raw) if d is not None]
         if devices:
             self.db.insert_devices(ts, devices, site=self.site)
 
-    def _poll_clients(self, ts: float) -> None:
-        raw = self.client.get_clients()
+    def _store_clients(self, ts: float, raw: list[dict]) -> None:
         clients = [c for c in (_parse_client(r) for r in raw) if c is not None]
         if clients:
             self.db.insert_clients(ts, clients, site=self.site)
 
-    def _poll_alarms(self, ts: float) -> None:
-        raw = self.client.get_alarms()
+    def _store_alarms(self, ts: float, raw: list[dict]) -> None:
         alarms = [_parse_alarm(a) for a in raw]
         if alarms:
             self.db.insert_alarms(ts, alarms, site=self.site)
@@ -241,9 +279,9 @@ class Poller:
             log.debug("Snapshot build failed: %s", e)
             return None
 
-        health = _compute_health(wan, devices, alarms)
-        wireless = [c for c in clients if not c.get("is_wired")]
-        wired = [c for c in clients if c.get("is_wired")]
+        online_count = sum(1 for d in devices if d.get("state") == 1)
+        wired_count = sum(1 for c in clients if c.get("is_wired"))
+        health = _compute_health(wan, len(devices) - online_count, alarms)
 
         return {
             "type": "update",
@@ -262,12 +300,12 @@ class Poller:
                 },
                 "devices": {
                     "total": len(devices),
-                    "online": sum(1 for d in devices if d.get("state") == 1),
+                    "online": online_count,
                 },
                 "clients": {
                     "total": len(clients),
-                    "wireless": len(wireless),
-                    "wired": len(wired),
+                    "wireless": len(clients) - wired_count,
+                    "wired": wired_count,
                 },
                 "alarms": len(alarms),
                 "timestamp": time.time(),
@@ -1,17 +1,20 @@
 # unifi_client.py -- UniFi OS API client
-# Thin requests.Session wrapper with CSRF handling and session reuse.
+# Thin httpx.AsyncClient wrapper with CSRF handling and session reuse.
 # Works with any UniFi OS gateway (UCG-Max, UDM, UDR, UDM-SE, etc.).
 
 from __future__ import annotations
 
+import asyncio
 import logging
 
-import requests
-import urllib3
+import httpx
+import orjson
 
 log = logging.getLogger(__name__)
 
 REQUEST_TIMEOUT = 15  # seconds
+# Keep-alive connections per gateway: one per endpoint the poller fetches concurrently
+POOL_MAXSIZE = 4
 
 
 class UnifiAuthError(Exception):
@@ -30,18 +33,23 @@ class UnifiClient:
         self.username = username
         self.password = password
         self.site = site
-        self.session = requests.Session()
-        self.session.verify = False
-        # Suppress SSL warnings only for this session's urllib3 pool
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        # One event loop drives every request, so the cookie jar and CSRF token are
+        # never touched from two threads. Gateways use self-signed certificates.
+        self.client = httpx.AsyncClient(
+            verify=False,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=POOL_MAXSIZE),
+        )
         self._csrf_token: str | None = None
         self._authenticated = False
+        # Concurrent requests that all hit a 401 re-login once, not once each
+        self._auth_lock = asyncio.Lock()
+        self._auth_generation = 0
 
-    def login(self) -> None:
-        resp = self.session.post(
+    async def login(self) -> None:
+        resp = await self.client.post(
             f"{self.base_url}/api/auth/login",
             json={"username": self.username, "password": self.password},
-            timeout=REQUEST_TIMEOUT,
         )
         if resp.status_code != 200:
             self._authenticated = False
@@ -50,17 +58,18 @@ class UnifiClient:
         if not self._csrf_token:
             raise UnifiAuthError("Login succeeded but no CSRF token in response")
         self._authenticated = True
+        self._auth_generation += 1
 
-    def ensure_auth(self) -> None:
+    async def ensure_auth(self) -> None:
         if not self._authenticated:
-            self.login()
+            await self.login()
 
-    def close(self) -> None:
-        """Close the underlying requests session."""
-        self.session.close()
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.aclose()
         self._authenticated = False
 
-    def _update_csrf(self, resp: requests.Response) -> None:
+    def _update_csrf(self, resp: httpx.Response) -> None:
         token = resp.headers.get("X-Updated-CSRF-Token") or resp.headers.get("X-CSRF-Token")
         if token:
             self._csrf_token = token
@@ -68,30 +77,34 @@ class UnifiClient:
     def _csrf_headers(self) -> dict[str, str]:
         return {"X-CSRF-Token": self._csrf_token} if self._csrf_token else {}
 
-    def _request(
+    async def _request(
         self, method: str, path: str, json_body: dict | None = None, retry_auth: bool = True
     ) -> dict:
-        resp = self.session.request(
+        generation = self._auth_generation
+        resp = await self.client.request(
             method,
             f"{self.base_url}{path}",
             json=json_body,
             headers=self._csrf_headers(),
-            timeout=REQUEST_TIMEOUT,
         )
         self._update_csrf(resp)
 
         if resp.status_code == 401 and retry_auth:
-            self._authenticated = False
-            self.login()
-            return self._request(method, path, json_body=json_body, retry_auth=False)
+            async with self._auth_lock:
+                # Skip if another request already logged in again since this one was sent
+                if self._auth_generation == generation:
+                    self._authenticated = False
+                    await self.login()
+            return await self._request(method, path, json_body=json_body, retry_auth=False)
 
         if resp.status_code not in (200, 201):
             raise UnifiAPIError(f"{method} {path} -> {resp.status_code}: {resp.text[:300]}")
 
-        return resp.json()
+        # orjson parses the raw bytes directly (several MiB for stat/device, stat/sta)
+        return orjson.loads(resp.content)
 
-    def _get(self, path: str) -> dict:
-        return self._request("GET", path)
+    async def _get(self, path: str) -> dict:
+        return await self._request("GET", path)
 
     def _extract(self, envelope: dict) -> list[dict]:
         meta = envelope.get("meta", {})
@@ -104,20 +117,20 @@ class UnifiClient:
 
     # -- Read endpoints --
 
-    def get_health(self) -> list[dict]:
-        return self._extract(self._get(self._site("stat/health")))
+    async def get_health(self) -> list[dict]:
+        return self._extract(await self._get(self._site("stat/health")))
 
-    def get_devices(self) -> list[dict]:
-        return self._extract(self._get(self._site("stat/device")))
+    async def get_devices(self) -> list[dict]:
+        return self._extract(await self._get(self._site("stat/device")))
 
-    def get_clients(self) -> list[dict]:
-        return self._extract(self._get(self._site("stat/sta")))
+    async def get_clients(self) -> list[dict]:
+        return self._extract(await self._get(self._site("stat/sta")))
 
-    def get_alarms(self) -> list[dict]:
-        return self._extract(self._get(self._site("stat/alarm")))
+    async def get_alarms(self) -> list[dict]:
+        return self._extract(await self._get(self._site("stat/alarm")))
 
-    def get_events(self, limit: int = 50) -> list[dict]:
-        return self._extract(self._get(self._site(f"stat/event?_limit={limit}")))
+    async def get_events(self, limit: int = 50) -> list[dict]:
+        return self._extract(await self._get(self._site(f"stat/event?_limit={limit}")))
 
-    def get_dpi(self) -> list[dict]:
-        return self._extract(self._get(self._site("stat/sitedpi")))
+    async def get_dpi(self) -> list[dict]:
+        return self._extract(await self._get(self._site("stat/sitedpi")))
@@ -3,13 +3,23 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
 
+import orjson
 from fastapi import WebSocket
 from starlette.websockets import WebSocketDisconnect
 
 log = logging.getLogger(__name__)
 
+# A client that can't take a frame within this long is dropped (and closed)
+SEND_TIMEOUT = 5.0
+CLOSE_TIMEOUT = 1.0
+
+# Send failures that just mean the client went away
+_GONE = (WebSocketDisconnect, RuntimeError, ConnectionError, asyncio.TimeoutError)
+
 
 class ConnectionManager:
     """Manages active WebSocket connections and broadcasts updates."""
@@ -29,11 +39,27 @@ class ConnectionManager:
     async def broadcast(self, data: dict) -> None:
         if not self._connections:
             return
-        dead: list[WebSocket] = []
-        for ws in self._connections:
-            try:
-                await ws.send_json(data)
-            except (WebSocketDisconnect, RuntimeError, ConnectionError):
-                dead.append(ws)
-        for ws in dead:
-            self._connections.discard(ws)
+        # Serialize once for all connections. Sent as a text frame: the dashboard
+        # JSON.parse()s event.data, which would be a Blob for binary frames.
+        message = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+        # Send to all connections concurrently: one slow client can't stall the rest
+        targets = list(self._connections)
+        results = await asyncio.gather(
+            *(self._send(ws, message) for ws in targets), return_exceptions=True
+        )
+        for ws, result in zip(targets, results, strict=True):
+            if isinstance(result, BaseException):
+                if not isinstance(result, _GONE):
+                    log.warning("WebSocket send failed: %r", result)
+                self._connections.discard(ws)
+
+    @staticmethod
+    async def _send(ws: WebSocket, message: str) -> None:
+        try:
+            await asyncio.wait_for(ws.send_text(message), SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Close it so the dashboard notices and reconnects: the endpoint's
+            # receive loop would otherwise keep the stalled socket open
+            with contextlib.suppress(Exception):
+                await asyncio.wait_for(ws.close(code=1011), CLOSE_TIMEOUT)
+            raise
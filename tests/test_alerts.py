@@ -57,6 +57,16 @@ class TestExtractMetric:
         snap = _make_snapshot(devices_total=3, devices_online=1)
         assert _extract_metric(snap, "device_offline") == 2
 
+    def test_client_signal_min(self) -> None:
+        snap = _make_snapshot()
+        snap["clients"] = [{"signal_dbm": -55}, {"signal_dbm": None}, {"signal_dbm": -70}, {}]
+        assert _extract_metric(snap, "client_signal") == -70
+
+    def test_client_signal_no_wireless(self) -> None:
+        snap = _make_snapshot()
+        snap["clients"] = [{"signal_dbm": None}]
+        assert _extract_metric(snap, "client_signal") is None
+
     def test_unknown_metric(self) -> None:
         snap = _make_snapshot()
         assert _extract_metric(snap, "unknown_metric") is None
@@ -105,6 +115,15 @@ class TestAlertEvaluation:
         second = engine.evaluate(snap)
         assert len(second) == 0  # cooldown blocks
 
+    def test_cooldown_survives_recompile(self) -> None:
+        engine = AlertEngine(
+            rules=[AlertRule("wan_status", "ne", "ok", "WAN down", 300)],
+        )
+        snap = _make_snapshot(wan_status="down")
+        assert len(engine.evaluate(snap)) == 1
+        engine._compile_rules()
+        assert len(engine.evaluate(snap)) == 0
+
     def test_multiple_rules_independent(self) -> None:
         engine = AlertEngine(
             rules=[
@@ -134,6 +153,59 @@ class TestAlertEvaluation:
         assert len(engine.evaluate(snap)) == 0
 
 
+class TestAlertRule:
+    def test_key_and_label_precomputed(self) -> None:
+        rule = AlertRule("wan_latency", "gt", 100, "Latency {value}ms", 600)
+        assert rule.key == "wan_latency_gt_100"
+        assert rule.label == "wan_latency gt 100"
+
+    def test_threshold_typed_at_construction(self) -> None:
+        rule = AlertRule("wan_latency", "gt", "100", "x")
+        assert rule.typed_threshold == 100.0
+        assert rule.threshold == "100"
+        assert AlertRule("device_offline", "gt", "0", "x").typed_threshold == 0
+        assert AlertRule("device_offline", "gt", 2.0, "x").typed_threshold == 2
+        assert AlertRule("wan_status", "ne", "ok", "x").typed_threshold == "ok"
+
+    def test_unknown_metric_raises(self) -> None:
+        with pytest.raises(ValueError, match="bogus"):
+            AlertRule("bogus", "gt", 0, "x")
+
+    def test_invalid_threshold_raises(self) -> None:
+        with pytest.raises(ValueError, match="wan_latency_gt_high"):
+            AlertRule("wan_latency", "gt", "high", "x")
+
+    def test_fractional_device_offline_threshold_raises(self) -> None:
+        with pytest.raises(ValueError, match="device_offline_gt_0.5"):
+            AlertRule("device_offline", "gt", 0.5, "x")
+        with pytest.raises(ValueError, match="device_offline_gt_0.5"):
+            AlertRule("device_offline", "gt", "0.5", "x")
+
+    def test_rules_are_immutable_and_hashable(self) -> None:
+        rule = AlertRule("wan_status", "ne", "ok", "WAN is {value}")
+        with pytest.raises(AttributeError):
+            rule.threshold = "down"  # type: ignore[misc]
+        assert {rule: 1}[AlertRule("wan_status", "ne", "ok", "WAN is {value}")] == 1
+
+    def test_fired_payload_uses_label(self) -> None:
+        engine = AlertEngine(
+            rules=[AlertRule("wan_latency", "gt", 100, "{metric} {value} > {threshold}", 0)]
+        )
+        fired = engine.evaluate(_make_snapshot(latency_ms=150.0))
+        assert fired[0]["rule"] == "wan_latency gt 100"
+        assert fired[0]["message"] == "wan_latency 150.0 > 100"
+
+
+class TestRuleCompilation:
+    def test_unknown_operator_raises(self) -> None:
+        with pytest.raises(ValueError, match="gte"):
+            AlertEngine(rules=[AlertRule("health_score", "gte", 50, "x", 0)])
+
+    def test_string_threshold_fires(self) -> None:
+        engine = AlertEngine(rules=[AlertRule("wan_latency", "gt", "100", "Latency {value}", 0)])
+        assert len(engine.evaluate(_make_snapshot(latency_ms=150.0))) == 1
+
+
 class TestDefaultRules:
     def test_default_rules_loaded(self) -> None:
         engine = AlertEngine()
@@ -150,3 +222,32 @@ async def test_notify_no_webhook() -> None:
     """notify() with no webhook_url should be a no-op."""
     engine = AlertEngine(webhook_url=None)
     await engine.notify([{"message": "test"}])  # Should not raise
+
+
+@pytest.mark.asyncio
+async def test_aclose_without_client() -> None:
+    """aclose() before any notification should be a no-op."""
+    engine = AlertEngine(webhook_url="http://localhost:9/hook")
+    await engine.aclose()
+    assert engine._client is None
+
+
+@pytest.mark.asyncio
+async def test_notify_circuit_breaker_opens_after_failures() -> None:
+    """Consecutive transport errors open the breaker and skip further POSTs."""
+    import httpx
+
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        raise httpx.ConnectError("unreachable", request=request)
+
+    engine = AlertEngine(webhook_url="http://webhook.invalid/hook")
+    engine._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    for _ in range(5):
+        await engine.notify([{"message": "test"}])
+    assert calls == 3
+    assert engine._breaker_until > time.time()
+    await engine.aclose()
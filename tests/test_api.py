@@ -2,11 +2,15 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import time
+from types import SimpleNamespace
 
+import pytest
 from fastapi.testclient import TestClient
 
+from unifi_monitor.api.routes import overview
 from unifi_monitor.app import app
 from unifi_monitor.config import config
 from unifi_monitor.db import Database
@@ -54,6 +58,34 @@ class TestOverview:
         assert data["wan"]["status"] == "no data"
         assert data["clients"]["total"] == 0
 
+    def test_overview_cache_invalidated_by_new_writes(self, tmp_db: Database):
+        app.state.db = tmp_db
+        app.state.start_time = time.time()
+        app.state.sites = ["default"]
+        client = TestClient(app)
+        first = client.get("/api/overview").json()
+        assert client.get("/api/overview").json()["timestamp"] == first["timestamp"]
+
+        tmp_db.insert_wan(time.time(), "ok", 12.0, "1.2.3.4", 10.0, 20.0)
+        data = client.get("/api/overview").json()
+        assert data["wan"]["status"] == "ok"
+
+    @pytest.mark.asyncio
+    async def test_overview_concurrent_misses_share_one_build(self, tmp_db: Database, monkeypatch):
+        calls = 0
+        real = tmp_db.get_latest_wan
+
+        def counting(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            return real(*args, **kwargs)
+
+        monkeypatch.setattr(tmp_db, "get_latest_wan", counting)
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+        results = await asyncio.gather(*(overview(request, tmp_db, "default") for _ in range(5)))
+        assert calls == 1
+        assert all(r is results[0] for r in results)
+
 
 class TestClients:
     def test_clients_returns_paginated(self, test_client: TestClient):
@@ -295,6 +327,17 @@ class TestAuth:
         resp = test_client.get("/api/overview", headers=self._basic_header("admin", "wrong"))
         assert resp.status_code == 401
 
+    def test_cached_creds_invalidated_on_password_change(
+        self, test_client: TestClient, monkeypatch
+    ):
+        monkeypatch.setattr(config, "auth_username", "admin")
+        monkeypatch.setattr(config, "auth_password", "secret")
+        headers = self._basic_header("admin", "secret")
+        assert test_client.get("/api/overview", headers=headers).status_code == 200
+        assert test_client.get("/api/overview", headers=headers).status_code == 200
+        monkeypatch.setattr(config, "auth_password", "rotated")
+        assert test_client.get("/api/overview", headers=headers).status_code == 401
+
     def test_health_bypasses_auth(self, test_client: TestClient, monkeypatch):
         monkeypatch.setattr(config, "auth_username", "admin")
         monkeypatch.setattr(config, "auth_password", "secret")
@@ -309,6 +352,17 @@ class TestAuth:
         data = resp.json()
         assert len(data["token"]) == 32
 
+    def test_ws_token_cached_per_credentials(self, monkeypatch):
+        from unifi_monitor.api.routes import _ws_token
+
+        monkeypatch.setattr(config, "auth_username", "admin")
+        monkeypatch.setattr(config, "auth_password", "secret")
+        current = _ws_token(0)
+        assert _ws_token(0) == current
+        assert _ws_token(-1) != current
+        monkeypatch.setattr(config, "auth_password", "other")
+        assert _ws_token(0) != current
+
     def test_token_returns_empty_when_auth_disabled(self, test_client: TestClient, monkeypatch):
         monkeypatch.setattr(config, "auth_username", "")
         monkeypatch.setattr(config, "auth_password", "")
@@ -316,6 +370,14 @@ class TestAuth:
         assert resp.status_code == 200
         assert resp.json()["token"] == ""
 
+    def test_root_revalidates_with_etag(self, test_client: TestClient):
+        resp = test_client.get("/")
+        assert resp.status_code == 200
+        assert resp.headers["cache-control"] == "no-cache"
+        cached = test_client.get("/", headers={"If-None-Match": resp.headers["etag"]})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
     def test_root_requires_auth(self, test_client: TestClient, monkeypatch):
         monkeypatch.setattr(config, "auth_username", "admin")
         monkeypatch.setattr(config, "auth_password", "secret")
@@ -0,0 +1,120 @@
+# test_collector.py -- Tests for NetFlow collector batching
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from unifi_monitor.db import Database
+from unifi_monitor.netflow import collector
+from unifi_monitor.netflow.collector import NetFlowProtocol
+
+FLOW = {
+    "src_ip": "10.0.0.1",
+    "dst_ip": "8.8.8.8",
+    "src_port": 5353,
+    "dst_port": 53,
+    "protocol": 17,
+    "bytes": 120,
+    "packets": 1,
+}
+
+
+@pytest.mark.asyncio
+async def test_aclose_writes_buffered_flows(tmp_db: Database):
+    proto = NetFlowProtocol(tmp_db)
+    proto.batch.extend([FLOW, FLOW])
+    proto._flush(1000.0)
+    proto.batch.append(FLOW)
+    await proto.aclose()
+    assert tmp_db.get_db_stats()["netflow_rows"] == 3
+    assert proto.batch == []
+
+
+@pytest.mark.asyncio
+async def test_flush_pauses_while_writer_is_behind(tmp_db: Database, monkeypatch):
+    monkeypatch.setattr(collector, "MAX_PENDING_FLUSHES", 0)
+    proto = NetFlowProtocol(tmp_db)
+    proto.batch.append(FLOW)
+    proto._flush(1000.0)
+    assert list(proto._held) == [(1000.0, [FLOW])]  # held back, not dropped
+    assert not proto._pending
+    await proto.aclose()
+    assert tmp_db.get_db_stats()["netflow_rows"] == 1
+
+
+@pytest.mark.asyncio
+async def test_held_back_batch_is_written_in_capped_slices(tmp_db: Database, monkeypatch):
+    monkeypatch.setattr(collector, "MAX_PENDING_FLUSHES", 0)
+    sizes: list[int] = []
+    insert = tmp_db.insert_netflow_batch
+
+    def recording_insert(ts, flows, site="default"):
+        sizes.append(len(flows))
+        insert(ts, flows, site)
+
+    monkeypatch.setattr(tmp_db, "insert_netflow_batch", recording_insert)
+    proto = NetFlowProtocol(tmp_db, batch_max_flows=2)
+    proto.batch.extend([FLOW] * 5)
+    await proto.aclose()
+    assert sizes == [2, 2, 1]
+    assert tmp_db.get_db_stats()["netflow_rows"] == 5
+
+
+@pytest.mark.asyncio
+async def test_aclose_cancels_periodic_flush(tmp_db: Database):
+    transport = await collector.start_collector(tmp_db, "127.0.0.1", 0)
+    proto = transport.get_protocol()
+    flush_task = proto._flush_task
+    assert not flush_task.done()
+    transport.close()
+    await proto.aclose()
+    assert flush_task.cancelled()
+
+
+def _stall_writer(db: Database, monkeypatch) -> tuple[threading.Event, list[tuple[float, int]]]:
+    """Block insert_netflow_batch until the returned event is set; record (ts, size)."""
+    release = threading.Event()
+    calls: list[tuple[float, int]] = []
+    insert = db.insert_netflow_batch
+
+    def stalled_insert(ts, flows, site="default"):
+        release.wait(5)
+        calls.append((ts, len(flows)))
+        insert(ts, flows, site)
+
+    monkeypatch.setattr(db, "insert_netflow_batch", stalled_insert)
+    return release, calls
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_capped_while_writer_stalls(tmp_db: Database, monkeypatch):
+    monkeypatch.setattr(collector, "MAX_PENDING_FLUSHES", 1)
+    monkeypatch.setattr(collector, "parse_packet", lambda data, templates: [FLOW, FLOW])
+    release, _ = _stall_writer(tmp_db, monkeypatch)
+    proto = NetFlowProtocol(tmp_db, batch_max_flows=2)
+    for _ in range(5):
+        proto.datagram_received(b"", ("10.0.0.9", 2055))
+    # One slice in the stalled writer, one held (the cap), three packets dropped
+    assert len(proto._pending) == 1
+    assert proto._held_flows == 2
+    assert proto._dropped == 6
+    release.set()
+    await proto.aclose()
+    assert tmp_db.get_db_stats()["netflow_rows"] == 4
+
+
+@pytest.mark.asyncio
+async def test_held_slices_keep_their_flush_ts(tmp_db: Database, monkeypatch):
+    monkeypatch.setattr(collector, "MAX_PENDING_FLUSHES", 1)
+    release, calls = _stall_writer(tmp_db, monkeypatch)
+    proto = NetFlowProtocol(tmp_db)
+    proto.batch.append(FLOW)
+    proto._flush(1000.0)
+    proto.batch.append(FLOW)
+    proto._flush(1010.0)
+    assert len(proto._pending) == 1
+    release.set()
+    await proto.aclose()
+    assert calls == [(1000.0, 1), (1010.0, 1)]
@@ -5,7 +5,7 @@ from __future__ import annotations
 import time
 from pathlib import Path
 
-from unifi_monitor.db import Database
+from unifi_monitor.db import EXPORT_BATCH_SIZE, Database, _fmt_bytes
 
 
 class TestDatabase:
@@ -72,6 +72,13 @@ class TestDatabase:
         assert result[0]["hostname"] == "laptop"
         assert result[0]["signal_dbm"] == -55
 
+    def test_latest_counts_use_newest_snapshot(self):
+        self.db.insert_devices(1.0, [{"mac": "aa", "state": 1}, {"mac": "bb", "state": 0}])
+        self.db.insert_devices(2.0, [{"mac": "aa", "state": 1}])
+        self.db.insert_clients(2.0, [{"mac": "c1", "is_wired": True}, {"mac": "c2"}])
+        assert self.db.get_latest_device_counts() == {"total": 1, "online": 1}
+        assert self.db.get_latest_client_counts() == {"total": 2, "wired": 1}
+
     def test_insert_netflow_and_top_talkers(self):
         ts = time.time()
         flows = [
@@ -111,6 +118,14 @@ class TestDatabase:
         assert talkers[0]["src_ip"] == "192.168.1.20"
         assert talkers[0]["total_bytes"] == 100000
 
+    def test_top_talkers_use_covering_index(self):
+        plan = self.db._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT src_ip, SUM(bytes), SUM(packets) FROM netflow"
+            " WHERE ts > ? AND site = ? GROUP BY src_ip",
+            (0, "default"),
+        ).fetchall()
+        assert any("COVERING INDEX idx_nf_site_ts_cover" in r["detail"] for r in plan)
+
     def test_top_ports(self):
         ts = time.time()
         flows = [
@@ -163,6 +178,60 @@ class TestDatabase:
         self.db.cleanup(retention_hours=1)
         assert self.db.get_latest_wan() is None
 
+    def test_cleanup_deletes_in_chunks(self, monkeypatch):
+        import unifi_monitor.db as db_module
+
+        monkeypatch.setattr(db_module, "CLEANUP_CHUNK_ROWS", 7)
+        old_ts = time.time() - 999999
+        for i in range(50):
+            self.db.insert_wan(old_ts + i, "ok", 10.0, "1.2.3.4", 25.0, 75.0)
+        self.db.insert_wan(time.time(), "ok", 11.0, "1.2.3.4", 25.0, 75.0)
+        self.db.cleanup(retention_hours=1)
+        assert self.db.get_db_stats()["wan_metrics_rows"] == 1
+
+    def test_cleanup_reclaims_free_pages(self):
+        old_ts = time.time() - 999999
+        for i in range(20):
+            self.db.insert_clients(
+                old_ts + i, [{"mac": f"aa:bb:cc:00:{i:02x}:{k:02x}"} for k in range(200)]
+            )
+        self.db.cleanup(retention_hours=1)
+        assert self.db._conn.execute("PRAGMA freelist_count").fetchone()["freelist_count"] == 0
+
+    def test_cleanup_vacuums_legacy_db_once_a_day(self, tmp_path: Path):
+        import sqlite3
+
+        path = tmp_path / "legacy.db"
+        legacy = sqlite3.connect(path)
+        legacy.execute("CREATE TABLE filler (x BLOB)")  # auto_vacuum=NONE, like old DBs
+        legacy.executemany("INSERT INTO filler VALUES (?)", ((b"x" * 1000,) for _ in range(500)))
+        legacy.commit()
+        legacy.close()
+        db = Database(path)
+        with db._write_txn() as conn:
+            conn.execute("DELETE FROM filler")
+        db.cleanup()
+        assert db._conn.execute("PRAGMA auto_vacuum").fetchone()["auto_vacuum"] == 2
+        assert db._last_vacuum > 0
+
+    def test_cleanup_skips_vacuum_within_a_day(self, tmp_path: Path):
+        import sqlite3
+
+        path = tmp_path / "legacy.db"
+        legacy = sqlite3.connect(path)
+        legacy.execute("CREATE TABLE filler (x BLOB)")
+        legacy.executemany("INSERT INTO filler VALUES (?)", ((b"x" * 1000,) for _ in range(500)))
+        legacy.commit()
+        legacy.close()
+        db = Database(path)
+        db._last_vacuum = last = time.time() - 3600  # an earlier cleanup VACUUMed an hour ago
+        with db._write_txn() as conn:
+            conn.execute("DELETE FROM filler")
+        db.cleanup()
+        assert db._last_vacuum == last
+        assert db._conn.execute("PRAGMA auto_vacuum").fetchone()["auto_vacuum"] == 0
+        assert db._conn.execute("PRAGMA freelist_count").fetchone()["freelist_count"] > 0
+
     def test_bandwidth_timeseries(self):
         now = time.time()
         flows = [
@@ -181,6 +250,100 @@ class TestDatabase:
         assert len(result) >= 1
         assert result[0]["total_bytes"] == 5000
 
+    def test_bandwidth_timeseries_mbps(self):
+        flows = [
+            {
+                "src_ip": "10.0.0.1",
+                "dst_ip": "10.0.0.2",
+                "src_port": 1,
+                "dst_port": 443,
+                "protocol": 6,
+                "bytes": 3_750_000_000,
+                "packets": 10,
+            },
+        ]
+        self.db.insert_netflow_batch(time.time(), flows)
+        result = self.db.get_bandwidth_timeseries(hours=1, bucket_minutes=5)
+        # 3.75 GB over a 300s bucket = 100 Mbps
+        assert result[0]["mbps"] == 100.0
+
+    def test_bandwidth_timeseries_5min_matches_buckets(self):
+        now = time.time()
+        expected: dict[int, int] = {}
+        for k in range(12):
+            ts = now - k * 170
+            flow = {
+                "src_ip": "10.0.0.1",
+                "dst_ip": "10.0.0.2",
+                "src_port": 1,
+                "dst_port": 443,
+                "protocol": 6,
+                "bytes": 100 + k,
+                "packets": 1,
+            }
+            self.db.insert_netflow_batch(ts, [flow])
+            bucket = int(ts // 300) * 300
+            expected[bucket] = expected.get(bucket, 0) + 100 + k
+        result = self.db.get_bandwidth_timeseries(hours=1, bucket_minutes=5)
+        assert {r["bucket"]: r["total_bytes"] for r in result} == expected
+        assert [r["bucket"] for r in result] == sorted(expected)
+
+    def test_bandwidth_rollup_backfill_and_wide_buckets(self):
+        now = time.time()
+        flow = {
+            "src_ip": "10.0.0.1",
+            "dst_ip": "10.0.0.2",
+            "src_port": 1,
+            "dst_port": 443,
+            "protocol": 6,
+            "bytes": 1000,
+            "packets": 2,
+        }
+        for k in range(6):
+            self.db.insert_netflow_batch(now - 600 - k * 400, [flow, flow])
+        expected = self.db._conn.execute(
+            "SELECT CAST(ts / 900 AS INTEGER) * 900 as bucket, SUM(bytes) as total_bytes"
+            " FROM netflow GROUP BY bucket ORDER BY bucket"
+        ).fetchall()
+        result = self.db.get_bandwidth_timeseries(hours=2, bucket_minutes=15)
+        totals = [{"bucket": r["bucket"], "total_bytes": r["total_bytes"]} for r in result]
+        assert totals == expected
+
+        # A DB from before the rollup existed is backfilled on open
+        with self.db._write_txn() as conn:
+            conn.execute("DROP TABLE netflow_rollup_5m")
+        reopened = Database(self.db.path)
+        assert reopened.get_bandwidth_timeseries(hours=2, bucket_minutes=15) == result
+
+    def test_bandwidth_window_skips_partial_first_bucket(self, monkeypatch):
+        import unifi_monitor.db as db_module
+
+        flow = {
+            "src_ip": "10.0.0.1",
+            "dst_ip": "10.0.0.2",
+            "src_port": 1,
+            "dst_port": 443,
+            "protocol": 6,
+            "bytes": 1000,
+            "packets": 2,
+        }
+        now = 1_000_000_150.0  # cutoff for hours=1 falls 50s into a 5-minute bucket
+        cutoff = now - 3600
+        self.db.insert_netflow_batch(cutoff + 10, [flow])  # inside the partial bucket
+        self.db.insert_netflow_batch(cutoff + 60, [flow])  # first whole bucket
+        monkeypatch.setattr(db_module.time, "time", lambda: now)
+        # Rollup path (5 min) and raw path (1 min) cover the same window
+        for minutes in (5, 1):
+            result = self.db.get_bandwidth_timeseries(hours=1, bucket_minutes=minutes)
+            assert sum(r["total_bytes"] for r in result) == 1000
+
+        # cleanup() deletes the first flow and drops its straddling rollup bucket
+        monkeypatch.setattr(db_module.time, "time", lambda: now + 30)
+        self.db.cleanup(retention_hours=1)
+        for minutes in (5, 1):
+            result = self.db.get_bandwidth_timeseries(hours=3, bucket_minutes=minutes)
+            assert sum(r["total_bytes"] for r in result) == 1000
+
     def test_get_db_stats(self):
         ts = time.time()
         self.db.insert_wan(ts, "ok", 10.0, "1.2.3.4", 30.0, 80.0)
@@ -196,6 +359,13 @@ class TestDatabase:
         assert stats["db_size_bytes"] > 0
         assert stats["last_write_ts"] == ts
 
+    def test_get_db_stats_without_counts(self):
+        self.db.insert_wan(time.time(), "ok", 10.0, "1.2.3.4", 30.0, 80.0)
+        stats = self.db.get_db_stats(counts=False)
+        assert stats["db_size_bytes"] > 0
+        assert stats["last_write_ts"] > 0
+        assert not any(k.endswith("_rows") for k in stats)
+
     def test_cleanup_with_valid_tables(self):
         """Verify cleanup only touches known tables."""
         ts = time.time()
@@ -227,6 +397,159 @@ class TestDatabase:
         stats = self.db.get_db_stats()
         assert stats["wan_metrics_rows"] == 1
 
+    def test_concurrent_writers_share_one_connection(self):
+        import threading
+
+        def write(n: int) -> None:
+            for i in range(50):
+                self.db.insert_wan(n * 1000 + i + 1, "ok", 10.0, "1.2.3.4", 30.0, 80.0)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert self.db.get_db_stats()["wan_metrics_rows"] == 200
+
+    def test_failed_batch_rolls_back(self):
+        import sqlite3
+
+        import pytest
+
+        # The second row violates devices.mac NOT NULL after the first was inserted
+        devices = [{"mac": "aa:bb:cc:dd:ee:01", "name": "AP"}, {"mac": None, "name": "bad"}]
+        with pytest.raises(sqlite3.IntegrityError):
+            self.db.insert_devices(time.time(), devices)
+        assert self.db.get_db_stats()["devices_rows"] == 0
+        self.db.insert_wan(time.time(), "ok", 10.0, "1.2.3.4", 30.0, 80.0)
+        assert self.db.get_db_stats()["wan_metrics_rows"] == 1
+
+    def test_failed_transaction_rolls_back_earlier_inserts(self):
+        import pytest
+
+        with pytest.raises(RuntimeError), self.db.transaction():
+            self.db.insert_wan(time.time(), "ok", 10.0, "1.2.3.4", 30.0, 80.0)
+            raise RuntimeError("poll cycle failed")
+        assert self.db.get_db_stats()["wan_metrics_rows"] == 0
+
+    def test_read_connection_is_query_only(self):
+        import sqlite3
+
+        import pytest
+
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            self.db._conn.execute("DELETE FROM wan_metrics")
+        self.db.insert_wan(time.time(), "ok", 10.0, "1.2.3.4", 30.0, 80.0)
+        assert self.db.get_latest_wan() is not None
+
+    def test_fresh_db_uses_8k_pages(self, tmp_path: Path):
+        db = Database(tmp_path / "fresh.db")
+        assert db._conn.execute("PRAGMA page_size").fetchone()["page_size"] == 8192
+        db.close()
+
+    def test_legacy_bucket_column_dropped(self, tmp_path: Path):
+        path = tmp_path / "legacy.db"
+        db = Database(path)
+        with db._write_txn() as conn:
+            conn.execute(
+                "ALTER TABLE netflow ADD COLUMN bucket_300 INTEGER"
+                " GENERATED ALWAYS AS (CAST(ts / 300 AS INTEGER)) VIRTUAL"
+            )
+            conn.execute("CREATE INDEX idx_nf_site_bucket ON netflow(site, bucket_300)")
+        db.close()
+        db = Database(path)
+        cols = [r["name"] for r in db._conn.execute("PRAGMA table_xinfo(netflow)").fetchall()]
+        assert "bucket_300" not in cols
+        db.close()
+
+    def test_transaction_groups_inserts(self):
+        import pytest
+
+        ts = time.time()
+        with self.db.transaction():
+            self.db.insert_wan(ts, "ok", 10.0, "1.2.3.4", 30.0, 80.0)
+            self.db.insert_devices(ts, [{"mac": "aa:00:00:00:00:01", "state": 1}])
+            # Not committed yet: readers and last_write_ts still see the old state
+            assert self.db.get_latest_wan() is None
+            assert self.db.last_write_ts == 0.0
+        assert self.db.last_write_ts == ts
+        assert self.db.get_latest_device_counts()["total"] == 1
+
+        with pytest.raises(RuntimeError), self.db.transaction():
+            self.db.insert_wan(ts + 1, "down", None, None, None, None)
+            raise RuntimeError
+        assert self.db.get_latest_wan()["status"] == "ok"
+        assert self.db.last_write_ts == ts
+
+    def test_export_json_matches_rows(self):
+        import json
+
+        import pytest
+
+        now = time.time()
+        # Oldest first, so insertion (rowid) order is the reverse of the export order
+        for k in (2, 1, 0):
+            self.db.insert_clients(now - k * 60, [{"mac": f"aa:00:00:00:00:0{k}", "rx_bytes": k}])
+        rows = self.db.get_clients_export(hours=1, limit=2)
+        exported = json.loads(self.db.get_clients_export_json(hours=1, limit=2))
+        assert [r["mac"] for r in exported] == ["aa:00:00:00:00:00", "aa:00:00:00:00:01"]
+        assert [r["mac"] for r in exported] == [r["mac"] for r in rows]
+        assert list(exported[0]) == list(rows[0])
+        # REALs go through 15 significant digits: ts round-trips to 10 us
+        assert exported[0]["ts"] == pytest.approx(rows[0]["ts"], abs=1e-5)
+        assert json.loads(self.db.get_wan_export_json(hours=1)) == []
+
+    def test_export_iterator_owns_its_connection(self):
+        import threading
+
+        now = time.time()
+        # One more row than a batch, so a half-read export keeps its cursor open
+        n = EXPORT_BATCH_SIZE + 1
+        macs = [f"aa:00:00:00:{k // 256:02x}:{k % 256:02x}" for k in range(n)]
+        self.db.insert_clients(now, [{"mac": mac} for mac in macs])
+        # Consumed on another thread, as StreamingResponse does
+        header, rows = self.db.iter_clients_export(hours=1)
+        out: list[tuple] = []
+        worker = threading.Thread(target=lambda: out.extend(rows))
+        worker.start()
+        worker.join()
+        assert header[:2] == ["ts", "mac"] and len(out) == n
+
+        # An abandoned download releases its read snapshot
+        _, rows = self.db.iter_clients_export(hours=1)
+        next(rows)
+        self.db.insert_wan(now, "ok", 10.0, "1.2.3.4", 30.0, 80.0)
+        rows.close()
+        busy = self.db._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]
+        assert busy == 0
+
+    def test_latest_clients_page_sorted_by_rx(self):
+        ts = time.time()
+        self.db.insert_clients(
+            ts,
+            [
+                {"mac": "aa:00:00:00:00:01", "rx_bytes": 100},
+                {"mac": "aa:00:00:00:00:02", "rx_bytes": 300},
+                {"mac": "aa:00:00:00:00:03", "rx_bytes": 200},
+            ],
+        )
+        page = self.db.get_latest_clients_page(offset=0, limit=2)
+        assert [c["rx_bytes"] for c in page] == [300, 200]
+        page = self.db.get_latest_clients_page(offset=2, limit=2)
+        assert [c["mac"] for c in page] == ["aa:00:00:00:00:01"]
+        assert self.db.count_latest_clients() == 3
+        assert self.db.count_latest_clients(site="other") == 0
+
+    def test_read_snapshot_ignores_concurrent_commit(self):
+        ts = time.time()
+        self.db.insert_clients(ts, [{"mac": "aa:00:00:00:00:01"}])
+        with self.db.read_snapshot():
+            assert self.db.count_latest_clients() == 1
+            self.db.insert_clients(ts + 30, [{"mac": f"aa:00:00:00:00:0{k}"} for k in (2, 3)])
+            assert self.db.count_latest_clients() == 1
+            assert len(self.db.get_latest_clients_page()) == 1
+        assert self.db.count_latest_clients() == 2
+
     def test_client_history(self):
         now = time.time()
         self.db.insert_clients(
@@ -352,6 +675,15 @@ class TestDns:
         assert self.db.get_dns_top_clients() == []
         assert self.db.get_dns_top_servers() == []
 
+    def test_dns_query_uses_covering_index(self):
+        plan = self.db._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT src_ip, COUNT(*) FROM netflow"
+            " WHERE ts > ? AND dst_port IN (53, 853) AND protocol IN (6, 17) AND site = ?"
+            " GROUP BY src_ip",
+            (0, "default"),
+        ).fetchall()
+        assert any("COVERING INDEX idx_nf_site_dns" in r["detail"] for r in plan)
+
 
 class TestMultiSite:
     def setup_method(self, method):
@@ -486,6 +818,24 @@ class TestEmptyDefaults:
         assert self.db.get_latest_wan() is None
         assert self.db.get_latest_devices() == []
         assert self.db.get_latest_clients() == []
+        assert self.db.get_latest_device_counts() == {"total": 0, "online": 0}
+        assert self.db.get_latest_client_counts() == {"total": 0, "wired": 0}
         assert self.db.get_active_alarms() == []
         assert self.db.get_top_talkers() == []
         assert self.db.get_wan_history() == []
+
+
+class TestFmtBytes:
+    def test_unit_boundaries(self):
+        assert _fmt_bytes(None) == "0 B"
+        assert _fmt_bytes(0) == "0 B"
+        assert _fmt_bytes(1023) == "1023 B"
+        assert _fmt_bytes(1024) == "1.0 KB"
+        assert _fmt_bytes(1_048_576) == "1.0 MB"
+        assert _fmt_bytes(1_073_741_824) == "1.0 GB"
+        assert _fmt_bytes(5 * 1_099_511_627_776) == "5120.0 GB"
+
+    def test_sql_function_registered(self, tmp_path: Path):
+        db = Database(tmp_path / "test.db")
+        row = db._conn.execute("SELECT fmt_bytes(2048) as v").fetchone()
+        assert row["v"] == "2.0 KB"
@@ -42,6 +42,23 @@ class TestExportClients:
         data = resp.json()
         assert len(data) == 1
 
+    def test_large_export_is_gzipped(self, tmp_db: Database):
+        import time
+
+        from unifi_monitor.app import app
+
+        ts = time.time()
+        tmp_db.insert_clients(
+            ts, [{"mac": f"aa:bb:cc:dd:{i // 256:02x}:{i % 256:02x}"} for i in range(100)]
+        )
+        app.state.db = tmp_db
+        app.state.sites = ["default"]
+        client = TestClient(app)
+        resp = client.get("/api/export/clients", headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200
+        assert resp.headers.get("content-encoding") == "gzip"
+        assert len(resp.json()) == 100
+
 
 class TestExportWan:
     def test_json_returns_list(self, test_client: TestClient):
@@ -71,3 +88,19 @@ class TestExportWan:
         resp = client.get("/api/export/wan?format=csv")
         assert resp.status_code == 200
         assert "no data" in resp.text
+
+
+class TestIterCsv:
+    def test_streams_from_generator(self):
+        from unifi_monitor.api.routes import _iter_csv
+
+        rows = ((f"m{i}", i) for i in range(3))
+        chunks = list(_iter_csv(["mac", "rx"], rows))
+        assert chunks[0] == "mac,rx\r\n"
+        assert len(chunks) == 4
+        assert list(csv.DictReader(io.StringIO("".join(chunks))))[2]["mac"] == "m2"
+
+    def test_empty_iterable(self):
+        from unifi_monitor.api.routes import _iter_csv
+
+        assert list(_iter_csv(["mac"], iter([]))) == ["no data\n"]
@@ -1,6 +1,15 @@
 # test_parser.py -- Tests for NetFlow/IPFIX parser utilities
 
-from unifi_monitor.netflow.parser import PROTO_MAP, extract_flow_fields, int_to_ipv4, int_to_ipv6
+import struct
+
+from unifi_monitor.netflow import parser
+from unifi_monitor.netflow.parser import (
+    PROTO_MAP,
+    extract_flow_fields,
+    int_to_ipv4,
+    int_to_ipv6,
+    parse_packet,
+)
 
 
 class TestIPConversion:
@@ -72,6 +81,20 @@ class TestExtractFlowFields:
         assert result["protocol"] == 17
         assert result["bytes"] == 500
 
+    def test_attribute_only_flow(self):
+        class AttrFlow:
+            sourceIPv4Address = 0xC0A80101
+            destinationIPv4Address = 0x08080808
+            destinationTransportPort = 53
+            protocolIdentifier = 17
+            octetDeltaCount = 80
+
+        result = extract_flow_fields(AttrFlow())
+        assert result["src_ip"] == "192.168.1.1"
+        assert result["dst_port"] == 53
+        assert result["bytes"] == 80
+        assert result["src_port"] == 0
+
     def test_missing_fields_default_to_zero(self):
         class FakeFlow:
             pass
@@ -94,3 +117,51 @@ class TestProtoMap:
         assert PROTO_MAP[6] == "TCP"
         assert PROTO_MAP[17] == "UDP"
         assert PROTO_MAP[1] == "ICMP"
+
+
+def _ipfix_packet(*sets: bytes) -> bytes:
+    body = b"".join(sets)
+    return struct.pack("!HHIII", 10, 16 + len(body), 0, 1, 0) + body
+
+
+def _template_set(tid: int, fields: list[tuple[int, int]]) -> bytes:
+    body = struct.pack("!HH", tid, len(fields))
+    body += b"".join(struct.pack("!HH", fid, length) for fid, length in fields)
+    return struct.pack("!HH", 2, 4 + len(body)) + body
+
+
+def _data_set(tid: int, records: list[bytes], padding: int = 0) -> bytes:
+    body = b"".join(records) + b"\0" * padding
+    return struct.pack("!HH", tid, 4 + len(body)) + body
+
+
+# src/dst IPv4, ports, protocol, octets, packets, flowStartMilliseconds (skipped)
+TEMPLATE = [(8, 4), (12, 4), (7, 2), (11, 2), (4, 1), (1, 8), (2, 8), (152, 8)]
+
+
+def _record(i: int) -> bytes:
+    return struct.pack("!IIHHBQQQ", 0xC0A80100 + i, 0x08080808, 50000 + i, 443, 6, 1500, 10, 0)
+
+
+class TestIpfixCompiledDecoder:
+    def test_matches_library_decoding(self, monkeypatch):
+        packet = _ipfix_packet(
+            _template_set(256, TEMPLATE), _data_set(256, [_record(i) for i in range(5)], 3)
+        )
+        fast = parse_packet(packet, {})
+        monkeypatch.setattr(parser, "_compile_ipfix_template", lambda fields: None)
+        assert parse_packet(packet, {}) == fast
+        assert len(fast) == 5
+        assert fast[1]["src_ip"] == "192.168.1.1"
+        assert fast[1]["src_port"] == 50001
+        assert fast[1]["bytes"] == 1500
+
+    def test_redefined_template_recompiles(self):
+        templates: dict = {}
+        parse_packet(_ipfix_packet(_template_set(256, TEMPLATE)), templates)
+        reordered = [(12, 4), (8, 4)] + TEMPLATE[2:]
+        flows = parse_packet(
+            _ipfix_packet(_template_set(256, reordered), _data_set(256, [_record(7)])), templates
+        )
+        assert flows[0]["dst_ip"] == "192.168.1.7"
+        assert flows[0]["src_ip"] == "8.8.8.8"
@@ -2,7 +2,15 @@
 
 from __future__ import annotations
 
+import asyncio
+
+import httpx
+import pytest
+
+from unifi_monitor.config import config
+from unifi_monitor.db import Database
 from unifi_monitor.poller import (
+    Poller,
     _parse_alarm,
     _parse_client,
     _parse_device,
@@ -10,6 +18,7 @@ from unifi_monitor.poller import (
     _safe_float,
     _safe_int,
 )
+from unifi_monitor.unifi_client import UnifiAPIError
 
 
 class TestSafeConversions:
@@ -172,3 +181,67 @@ class TestParseAlarm:
         raw = {"_id": "x", "archived": True}
         a = _parse_alarm(raw)
         assert a["archived"] is True
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    async def ensure_auth(self):
+        pass
+
+    async def aclose(self):
+        self.closed = True
+
+    async def get_health(self):
+        return [{"subsystem": "wan", "status": "ok", "latency": 5}]
+
+    async def get_devices(self):
+        return [{"mac": "aa:bb:cc:dd:ee:01", "name": "AP", "state": 1}]
+
+    async def get_clients(self):
+        raise UnifiAPIError("stat/sta -> 500")
+
+    async def get_alarms(self):
+        return [{"_id": "a1", "msg": "AP lost contact"}]
+
+
+class TimeoutClient(FakeClient):
+    async def get_clients(self):
+        raise httpx.ReadTimeout("stat/sta read timed out")
+
+
+class TestPollCycle:
+    @pytest.mark.asyncio
+    async def test_failed_endpoint_does_not_block_others(self, tmp_db: Database):
+        poller = Poller(tmp_db)
+        poller.client = FakeClient()
+        await poller._poll_cycle()
+        assert tmp_db.get_latest_wan()["status"] == "ok"
+        assert len(tmp_db.get_latest_devices()) == 1
+        assert len(tmp_db.get_active_alarms()) == 1
+        assert tmp_db.get_latest_clients() == []
+        assert (poller._success_count, poller._error_count) == (3, 1)
+
+    @pytest.mark.asyncio
+    async def test_transport_error_keeps_other_endpoints(self, tmp_db: Database):
+        poller = Poller(tmp_db)
+        poller.client = TimeoutClient()
+        await poller._poll_cycle()
+        assert tmp_db.get_latest_wan()["status"] == "ok"
+        assert len(tmp_db.get_latest_devices()) == 1
+        assert len(tmp_db.get_active_alarms()) == 1
+        assert tmp_db.get_latest_clients() == []
+        assert (poller._success_count, poller._error_count) == (3, 1)
+
+    @pytest.mark.asyncio
+    async def test_stop_ends_run_and_closes_client(self, tmp_db: Database, monkeypatch):
+        monkeypatch.setattr(config, "poll_interval", 0)
+        poller = Poller(tmp_db)
+        client = poller.client = FakeClient()
+        task = asyncio.create_task(poller.run())
+        await asyncio.sleep(0.05)
+        poller.stop()
+        await asyncio.wait_for(task, 1)
+        assert client.closed
+        assert poller._cycle_count >= 1
@@ -0,0 +1,45 @@
+# test_unifi_client.py -- Tests for the UniFi OS API client (mocked transport)
+
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from unifi_monitor.unifi_client import UnifiClient
+
+
+def _mock_gateway(state: dict) -> httpx.MockTransport:
+    """Gateway that accepts only the cookie from the latest login."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/auth/login":
+            state["logins"] += 1
+            state["valid"] = f"t{state['logins']}"
+            return httpx.Response(
+                200,
+                headers={"X-CSRF-Token": "csrf", "Set-Cookie": f"TOKEN={state['valid']}; Path=/"},
+            )
+        if request.headers.get("cookie") != f"TOKEN={state['valid']}":
+            return httpx.Response(401)
+        return httpx.Response(200, json={"meta": {"rc": "ok"}, "data": [{"ok": True}]})
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_401s_log_in_once():
+    state = {"logins": 0, "valid": None}
+    client = UnifiClient("gw.test", "admin", "pw")
+    await client.aclose()
+    client.client = httpx.AsyncClient(transport=_mock_gateway(state))
+    await client.ensure_auth()
+    state["valid"] = "expired"  # session times out on the gateway
+
+    results = await asyncio.gather(
+        client.get_health(), client.get_devices(), client.get_clients(), client.get_alarms()
+    )
+    assert results == [[{"ok": True}]] * 4
+    assert state["logins"] == 2
+    await client.aclose()
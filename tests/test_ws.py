@@ -2,27 +2,41 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
+
 import pytest
 
+from unifi_monitor import ws as ws_module
 from unifi_monitor.ws import ConnectionManager
 
 
 class FakeWebSocket:
     """Minimal mock for fastapi.WebSocket."""
 
-    def __init__(self, *, fail_on_send: bool = False) -> None:
+    def __init__(self, *, fail_on_send: bool = False, hang_on_send: bool = False) -> None:
         self.accepted = False
         self.messages: list[dict] = []
         self._fail_on_send = fail_on_send
+        self._hang_on_send = hang_on_send
+        self.close_code: int | None = None
 
     async def accept(self) -> None:
         self.accepted = True
 
+    async def close(self, code: int = 1000) -> None:
+        self.close_code = code
+
     async def send_json(self, data: dict) -> None:
         if self._fail_on_send:
             raise RuntimeError("connection closed")
         self.messages.append(data)
 
+    async def send_text(self, data: str) -> None:
+        if self._hang_on_send:
+            await asyncio.sleep(3600)
+        await self.send_json(json.loads(data))
+
 
 @pytest.mark.asyncio
 async def test_connect_disconnect() -> None:
@@ -62,6 +76,39 @@ async def test_broadcast_skips_dead_connections() -> None:
     assert len(ws_ok.messages) == 1
 
 
+@pytest.mark.asyncio
+async def test_broadcast_drops_stalled_connection(monkeypatch) -> None:
+    monkeypatch.setattr(ws_module, "SEND_TIMEOUT", 0.05)
+    mgr = ConnectionManager()
+    ws_ok = FakeWebSocket()
+    ws_stuck = FakeWebSocket(hang_on_send=True)
+    await mgr.connect(ws_stuck)
+    await mgr.connect(ws_ok)
+    await mgr.broadcast({"type": "update"})
+    assert len(ws_ok.messages) == 1
+    assert len(mgr._connections) == 1
+    assert ws_stuck.close_code == 1011
+    assert ws_ok.close_code is None
+
+
+@pytest.mark.asyncio
+async def test_broadcast_drops_sockets_after_unexpected_error() -> None:
+    mgr = ConnectionManager()
+    ws_ok = FakeWebSocket()
+    ws_broken = FakeWebSocket()
+    ws_dead = FakeWebSocket(fail_on_send=True)
+
+    async def send_text(data: str) -> None:
+        raise ValueError("unexpected")
+
+    ws_broken.send_text = send_text  # type: ignore[method-assign]
+    for ws in (ws_broken, ws_ok, ws_dead):
+        await mgr.connect(ws)
+    await mgr.broadcast({"type": "update"})
+    assert len(ws_ok.messages) == 1
+    assert mgr._connections == {ws_ok}
+
+
 @pytest.mark.asyncio
 async def test_broadcast_empty_no_op() -> None:
     mgr = ConnectionManager()